@@ -17,16 +17,16 @@ fileconf = pm.fileConfig('lake.config')
 filelist = sorted(glob('ex_data/*'))
 #-----------
 
-allresults=[]
-for fname in filelist:
-    data, units = pm.timeSeries(fname, fileconf, parse_dates=True)
+store = pm.resultsStore('fluxes.db')
+for data in pm.iterRuns(filelist, fileconf, rule='30min', prefetch=1):
+    units = fileconf.units.copy()
     data = data.rotateCoor(how='2d')
     data = pm.preProcess(data, units, expand_temperature=True, use_means=False, rho_air_from_theta_v=True, solutes=['co2'], inplace_units=True)
     ddata = data.detrend(how='linear', units=units, ignore=['theta', 'p'])
     data = data.join(ddata)
 
     results = pm.eddyCovariance(data, units, site_config=siteconf, get_turbulent_scales=True, wpl=True)
-    allresults.append(results)
+    store.append(results, units)
 
-fluxes = pd.concat(allresults)
-print(fluxes.with_units(units))
+fluxes, fluxunits = store.read()
+print(fluxes.with_units(fluxunits))
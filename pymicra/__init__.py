@@ -11,16 +11,49 @@ vfile = os.path.join(os.path.dirname(os.path.realpath(__file__)),'version')
 __version__ = open(vfile, 'rt').read().strip()
 
 #---------
-# Here we create a "global" unitregistry for pymicra
-try:
-    from pint.unit import UnitRegistry
-    import os
-    abspath = os.path.dirname(os.path.abspath(__file__))
-    ureg = UnitRegistry()
-    ureg.load_definitions(os.path.join(abspath,'pymicra.pint'))
-    Q_ = ureg.Quantity
-except ImportError:
-    print('No pint installed yet. Install pint!')
+# The "global" UnitRegistry for pymicra (and its Quantity class Q_) is only created the first
+# time it's used, since importing pint and building the registry take longer than importing
+# everything else. The same goes for the default notation and the numba-compiled functions.
+import threading as _threading
+_lazy_lock = _threading.RLock()
+
+def _unit_registry():
+    """
+    Creates the UnitRegistry with pymicra's definitions (only once, even with many threads)
+    """
+    global ureg, Q_
+    with _lazy_lock:
+        if 'ureg' not in globals():
+            try:
+                from pint import UnitRegistry
+            except ImportError:
+                raise ImportError('No pint installed yet. Install pint!')
+            abspath = os.path.dirname(os.path.abspath(__file__))
+            registry = UnitRegistry()
+            registry.load_definitions(os.path.join(abspath,'pymicra.pint'))
+            Q_ = registry.Quantity
+            ureg = registry
+    return ureg
+
+
+def __getattr__(name):
+    """
+    Creates ureg, Q_ and notation on first use and imports the numba-compiled functions only
+    when they're needed
+    """
+    global notation
+    if name in ('ureg', 'Q_'):
+        _unit_registry()
+        return globals()[ name ]
+    elif name == 'notation':
+        with _lazy_lock:
+            if 'notation' not in globals():
+                notation = Notation()
+        return notation
+    elif name in ('bulk_corr', 'reverse_arrangements', 'cvariogram'):
+        from . import signal
+        return getattr(signal, name)
+    raise AttributeError("module 'pymicra' has no attribute '{}'".format(name))
 #---------
 from . import decorators
 
@@ -29,6 +62,8 @@ from .util import *
 from .micro import *
 from .signal import *
 from .core import *
+from .catalog import *
+from .store import *
 
 from . import io
 from . import physics
@@ -37,9 +72,10 @@ from . import constants
 from .micro import spectral
 from . import micro
 from . import algs
+from . import catalog
+from . import store
 from . import methods
 
-notation = Notation()
 
 #---------
 # Some quick pandas display configurations
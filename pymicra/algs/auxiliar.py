@@ -108,14 +108,173 @@ def applyResult(result, failed, df, control=None, testname=None, filename=None,
     return control
 
 
-def first_last(fname):
+def float_dtype(data):
     """
-    Returns first and last lines of a file
+    Returns the widest floating point dtype among the columns of data (float64 if there's none)
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or pandas.Series
+        dataset
+
+    Returns
+    -------
+    numpy.dtype
+    """
+    import numpy as np
+
+    dtypes = data.dtypes if hasattr(data, 'columns') else [ data.dtype ]
+    floats = [ dtype for dtype in dtypes if dtype.kind == 'f' ]
+    if floats:
+        return np.result_type(*floats)
+    return np.dtype('float64')
+
+
+def astype_floats(data, dtype):
     """
+    Casts the floating point columns of data to dtype, leaving the other columns untouched.
+    Always returns a copy.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or pandas.Series
+        dataset
+    dtype: numpy.dtype or str
+        floating point dtype. E.g. "float32"
+
+    Returns
+    -------
+    pandas.DataFrame or pandas.Series
+    """
+    if hasattr(data, 'columns'):
+        return data.astype({ col : dtype for col in data.columns
+                             if data[col].dtype.kind == 'f' and data[col].dtype != dtype })
+    elif data.dtype.kind == 'f':
+        return data.astype(dtype)
+    else:
+        return data.copy()
+
+
+#---------
+# Magic numbers that identify compressed files and their file extensions
+_COMPRESSIONS = [ ('gzip', b'\x1f\x8b', '.gz'),
+                  ('bz2', b'BZh', '.bz2'),
+                  ('xz', b'\xfd7zXZ\x00', '.xz'),
+                  ('zstd', b'\x28\xb5\x2f\xfd', '.zst') ]
+#---------
+
+
+def compression(fname):
+    """
+    Identifies the compression of a file by its first bytes
+
+    Parameters
+    ----------
+    fname: str
+        path of the file
+
+    Returns
+    -------
+    str or None
+        one of "gzip", "bz2", "xz" or "zstd" (same names as pandas' compression keyword), or None if
+        the file isn't compressed
+    """
+    with open(fname, 'rb') as fin:
+        magic = fin.read(6)
+    for name, number, ext in _COMPRESSIONS:
+        if magic.startswith(number):
+            return name
+    return None
+
+
+def open_file(fname, mode='rb'):
+    """
+    Opens a file that may be compressed with gzip, bz2, xz or zstd. Compressed files are
+    decompressed as they are read, so the uncompressed file is never written to disk.
+    zstd needs the zstandard package.
+
+    Parameters
+    ----------
+    fname: str
+        path of the file
+    mode: str
+        either "rb" or "rt"
+
+    Returns
+    -------
+    file object
+    """
+    import io
+
+    comp = compression(fname)
+    if comp is None:
+        return open(fname, mode)
+    elif comp == 'gzip':
+        import gzip
+        return gzip.open(fname, mode)
+    elif comp == 'bz2':
+        import bz2
+        return bz2.open(fname, mode)
+    elif comp == 'xz':
+        import lzma
+        return lzma.open(fname, mode)
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Reading zstd-compressed files needs the zstandard package. Install zstandard!')
+        fin = zstandard.ZstdDecompressor().stream_reader(open(fname, 'rb'), closefd=True)
+        fin = io.BufferedReader(fin)
+        if 't' in mode:
+            return io.TextIOWrapper(fin)
+        return fin
+
+
+def strip_compression(fname):
+    """
+    Removes the extension of compressed files (e.g. ".gz") from a file name
+    """
+    for name, number, ext in _COMPRESSIONS:
+        if fname.endswith(ext):
+            return fname[:-len(ext)]
+    return fname
+
+
+def first_last(fname, block_size=2**12):
+    """
+    Returns first and last lines of a file (as bytes, including their newline characters).
+    The last line is found by reading the file backwards from its end, so only the end of
+    the file is read. Compressed files have to be read from the beginning.
+    """
+    import os
+
+    #---------
+    # Compressed files can't be read backwards
+    if compression(fname):
+        with open_file(fname, 'rb') as fin:
+            first=line=fin.readline()
+            for line in fin:
+                pass
+            last=line
+        return first, last
+    #---------
+
     with open(fname, 'rb') as fin:
         first=fin.readline()
-        for line in fin:
-            pass
-        last=line
-    return first, last
+        end=fin.seek(0, os.SEEK_END)
+        #---------
+        # Reads blocks backwards until the newline that precedes the last line is found.
+        # A newline at the very end of the file belongs to the last line
+        tail=b''
+        pos=end
+        while pos > 0:
+            step=min(block_size, pos)
+            pos-=step
+            fin.seek(pos)
+            tail=fin.read(step) + tail
+            idx=tail.rfind(b'\n', 0, len(tail)-1)
+            if idx >= 0:
+                return first, tail[idx+1:]
+        #---------
+    return first, tail
 
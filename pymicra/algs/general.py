@@ -52,8 +52,8 @@ def splitData(data, rule='30min', return_index=False, **kwargs):
         #---------
         # We first create the index in which we base our separation
         # THIS STEP CAN PROBABLY BE IMPROVED
-        res_dates = pd.Series(index=data.index).resample(rule, **kwargs).index
-        intervals = zip(res_dates, res_dates[1:], fillvalue=data.index[-1] + pd.DateOffset(microseconds=2))
+        res_dates = pd.Series(index=data.index, dtype=float).resample(rule, **kwargs).mean().index
+        intervals = izip(res_dates, res_dates[1:], fillvalue=data.index[-1] + pd.DateOffset(microseconds=2))
         #---------
 
         out = [ data.loc[ bdate:edate - pd.DateOffset(microseconds=1) ] for bdate, edate in intervals ]
@@ -193,23 +193,60 @@ def limitedSubs(data, max_interp=3, func=lambda x: abs(x) > abs(x.std()*4.) ):
 
 
 
-def file_len(fname):
+def file_len(fname, block_size=2**20):
     """
-    Returns length of a file through piping bash's function wc
+    Returns length of a file (number of newline characters, same as bash's wc -l).
+    The file is read in blocks, so memory use is constant, and compressed files
+    are counted as they are decompressed.
 
     Parameters
     -----------
 
     fname: string
         path of the file
+    block_size: int
+        size in bytes of the blocks read at a time
     """
-    import subprocess
-    p = subprocess.Popen(['wc', '-l', fname], stdout=subprocess.PIPE, 
-                                              stderr=subprocess.PIPE)
-    result, err = p.communicate()
-    if p.returncode != 0:
-        raise IOError(err)
-    return int(result.strip().split()[0])
+    import numpy as np
+    from .auxiliar import open_file
+
+    #---------
+    # Blocks are read into the same buffer and its newlines are counted with numpy
+    buf = bytearray(block_size)
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    count = 0
+    with open_file(fname, 'rb') as fin:
+        while True:
+            n = fin.readinto(buf)
+            if not n:
+                break
+            count += int(np.count_nonzero(arr[:n] == 10))
+    #---------
+    return count
+
+
+def file_lens(flist, n_jobs=8):
+    """
+    Returns the lengths of many files (see file_len), counting them in a pool of threads
+
+    Parameters
+    -----------
+    flist: list
+        paths of the files
+    n_jobs: int
+        number of threads used
+
+    Returns
+    -------
+    list
+        lengths of the files in the same order as flist
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if n_jobs == 1:
+        return [ file_len(fname) for fname in flist ]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(file_len, flist))
 
 
 def inverse_normal_cdf(mu, sigma):
@@ -228,12 +265,21 @@ def inverse_normal_cdf(mu, sigma):
     return f
 
 
-def parseDates(data, dataloggerConfig=None, date_col_names=None, clean=True, verbose=False, connector=''):
+def parseDates(data, dataloggerConfig=None, date_col_names=None, clean=True, verbose=False, connector='',
+        fast=True, fixed_frequency=False, frequency=None):
     """
     Author: Tomas Chor
     date: 2015-08-10
     This routine parses the date from a pandas DataFrame when it is divided into several columns
 
+    Common layouts of date columns are recognized and their timestamps are built arithmetically,
+    which is much faster than joining the columns into strings and parsing them. These are:
+
+    - a date column (e.g. `%Y-%m-%d`) plus a time column (`%H:%M:%S` or `%H:%M:%S.%f`)
+    - Campbell-style integer columns `%Y`, `%j`, `%H%M` and, optionally, `%S`
+
+    Any other layout (or data that doesn't fit them) is parsed the usual way.
+
     Parameters
     -----------
     data: pandas DataFrame
@@ -249,6 +295,17 @@ def parseDates(data, dataloggerConfig=None, date_col_names=None, clean=True, ver
         the offset (mostly because of the bad converting done by LBA
     clean: bool
         remove date columns from data after it is introduced as index
+    fast: bool
+        whether to try to build the timestamps arithmetically for the layouts above
+    fixed_frequency: bool
+        if True, only the first and last timestamps (and the ones at a quarter, half and three
+        quarters of the data) are parsed and the index is built from the first one and the
+        frequency. If any of them doesn't match (i.e. there are gaps or repeated lines) every
+        timestamp is parsed. Note that gaps and repeated lines that cancel each other out between
+        the checked lines go undetected, so only use it for data known to be regular.
+    frequency: float
+        frequency of the data in Hz. Only used if fixed_frequency==True. Taken from dataloggerConfig
+        if not given.
 
     Returns
     -------
@@ -261,13 +318,60 @@ def parseDates(data, dataloggerConfig=None, date_col_names=None, clean=True, ver
     # If dataloggerConfig object is provided, we take the keywords from it
     if dataloggerConfig:
         date_col_names = dataloggerConfig.date_col_names
+        if frequency is None:
+            frequency = getattr(dataloggerConfig, 'frequency', None)
     elif date_col_names==None:
         raise NameError('Must provide either fileConfig or date_col_names')
     #------------------------------------
 
-    #------------------------------------
-    # Joins the names of the columns, which must match the datetime directive (see __doc__)
     if verbose: print('Using these columns: ', date_col_names)
+
+    #-------------------------------------
+    # First we try to avoid parsing every timestamp
+    dates = None
+    if fixed_frequency and frequency and len(data)>1:
+        dates = _fixedFrequencyDates(data, date_col_names, connector, frequency)
+    if (dates is None) and fast:
+        dates = _fastDates(data, date_col_names)
+    #-------------------------------------
+
+    #-------------------------------------
+    # If not possible, we parse the timestamps joining the date columns. Otherwise the dates
+    # are given the same dtype (and no freq) as if they had been parsed that way, so that the
+    # index doesn't depend on how the dates were parsed
+    if dates is None:
+        dates = _stringDates(data, date_col_names, connector)
+    else:
+        try:
+            dtype = _stringDates(data.iloc[:1], date_col_names, connector).dtype
+        except ValueError:
+            dtype = dates.dtype
+        dates = pd.DatetimeIndex(dates.values.astype(dtype))
+    #-------------------------------------
+
+    #-------------------------------------
+    # setting new dates list as the index
+    data=data.set_index([dates])
+    data.index.name = 'Timestamp'
+    #-------------------------------------
+
+    #-------------------------------------
+    # removing the columns used to generate the date
+    if clean:
+        data=data.drop(date_col_names, axis=1)
+    #-------------------------------------
+
+    return data
+
+
+def _stringDates(data, date_col_names, connector=''):
+    """
+    Parses the dates of data by joining the date columns into strings
+    """
+    import pandas as pd
+
+    #------------------------------------
+    # Joins the names of the columns, which must match the datetime directive (see parseDates)
     date_format=connector.join(date_col_names)
     #------------------------------------
 
@@ -280,22 +384,158 @@ def parseDates(data, dataloggerConfig=None, date_col_names=None, clean=True, ver
 
     for col in date_col_names[1:]:
         aux+=connector + data[col].astype(str)
-    dates=pd.to_datetime(aux, format=date_format)
+    return pd.to_datetime(aux, format=date_format)
     #-------------------------------------
 
+
+def _fixedFrequencyDates(data, date_col_names, connector, frequency):
+    """
+    Builds the dates of data from its first timestamp and the frequency. Returns None
+    if the last timestamp, or the ones at a quarter, half and three quarters of the data,
+    don't match the ones expected.
+    """
+    import pandas as pd
+
+    n = len(data)
+    positions = sorted(set([0, n//4, n//2, (3*n)//4, n-1]))
+    stamps = _stringDates(data.iloc[positions], date_col_names, connector)
+    dates = pd.date_range(start=stamps.iloc[0], periods=n, freq=pd.Timedelta(seconds=1./frequency))
+    if (dates[positions] != pd.DatetimeIndex(stamps)).any():
+        return None
+    return dates
+
+
+def _timeOfDay(times):
+    """
+    Converts fixed-width HH:MM:SS[.fff] strings to timedeltas by reading their digits
+    directly. Returns None if the strings don't all have this exact layout.
+    """
+    import numpy as np
+
+    chars = np.asarray(times).astype('S')
+    width = chars.dtype.itemsize
+    if (width<8) or (width==9) or (width>18):
+        return None
+    digits = np.frombuffer(chars.tobytes(), dtype=np.uint8).reshape(len(chars), width).astype(np.int64) - ord('0')
+
+    #-------
+    # Checks the separators and that every other character is a digit
+    seps = { 2 : ord(':'), 5 : ord(':'), 8 : ord('.') }
+    for pos in range(width):
+        if pos in seps:
+            if (digits[:, pos] != seps[pos]-ord('0')).any():
+                return None
+        elif ((digits[:, pos]<0) | (digits[:, pos]>9)).any():
+            return None
+    #-------
+
+    hours = digits[:, 0]*10 + digits[:, 1]
+    minutes = digits[:, 3]*10 + digits[:, 4]
+    seconds = digits[:, 6]*10 + digits[:, 7]
+    if (hours>=24).any() or (minutes>=60).any() or (seconds>=60).any():
+        return None
+    nanosecs = (hours*3600 + minutes*60 + seconds)*10**9
+    for pos in range(9, width):
+        nanosecs += digits[:, pos]*10**(17-pos)
+    return nanosecs.astype('timedelta64[ns]')
+
+
+def _fastDates(data, date_col_names):
+    """
+    Builds the dates of data arithmetically for common layouts of the date columns.
+    Returns None if the layout isn't recognized or if the data doesn't fit it.
+    """
+    import re
+    import numpy as np
+    import pandas as pd
+
+    names = list(date_col_names)
+
     #-------------------------------------
-    # setting new dates list as the index
-    data=data.set_index([dates])
-    data.index.name = 'Timestamp'
+    # Date and time-of-day columns: each date is parsed once and time is added as a timedelta
+    time_fmts = ['%H:%M:%S', '%H:%M:%S.%f']
+    if (len(names)==2) and (len(set(names) & set(time_fmts))==1):
+        tcol = [ name for name in names if name in time_fmts ][0]
+        dcol = [ name for name in names if name!=tcol ][0]
+        if not (re.match(r'^(%[Ymd]|[^%])+$', dcol) and all(d in dcol for d in ['%Y', '%m', '%d'])):
+            return None
+        try:
+            codes, uniques = pd.factorize(data[dcol].astype(str))
+            if (codes<0).any():
+                return None
+            days = pd.to_datetime(pd.Series(uniques), format=dcol).values.astype('datetime64[ns]')[codes]
+            times = _timeOfDay(data[tcol].values)
+            if times is None:
+                times = pd.to_timedelta(data[tcol].astype(str)).values.astype('timedelta64[ns]')
+        except (ValueError, UnicodeEncodeError):
+            return None
+        if np.isnat(times).any() or (times<np.timedelta64(0, 'ns')).any() or (times>=np.timedelta64(1, 'D')).any():
+            return None
+        return pd.DatetimeIndex(days + times)
     #-------------------------------------
 
     #-------------------------------------
-    # removing the columns used to generate the date
-    if clean:
-        data=data.drop(date_col_names, axis=1)
+    # Campbell-style integer columns of year, day of year, hourminute (and seconds)
+    campbell = ['%Y', '%j', '%H%M', '%S']
+    if set(names) <= set(campbell) and set(campbell[:3]) <= set(names):
+        try:
+            cols = { name : pd.to_numeric(data[name]).values.astype(np.float64) for name in names }
+        except (ValueError, TypeError):
+            return None
+        if not all(np.isfinite(col).all() for col in cols.values()):
+            return None
+        year, doy, hm = cols['%Y'], cols['%j'], cols['%H%M']
+        secs = cols.get('%S', np.zeros(len(data)))
+        hours, minutes = hm//100, hm%100
+        if ((doy<1) | (doy>366) | (hours>=24) | (minutes>=60) | (secs<0) | (secs>=60)).any():
+            return None
+        if (doy>np.where(year%4==0, np.where(year%100==0, np.where(year%400==0, 366, 365), 366), 365)).any():
+            return None
+        if (year!=np.round(year)).any() or (hm!=np.round(hm)).any() or (doy!=np.round(doy)).any():
+            return None
+        years = (year.astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[ns]')
+        seconds = (doy.astype(np.int64)-1)*86400 + hours.astype(np.int64)*3600 + minutes.astype(np.int64)*60
+        nanosecs = seconds*10**9 + np.round(secs*1e9).astype(np.int64)
+        return pd.DatetimeIndex(years + nanosecs.astype('timedelta64[ns]'))
     #-------------------------------------
 
-    return data
+    return None
+
+
+_bin_ufuncs = { np.sum : np.add, np.max : np.maximum, np.min : np.minimum }
+
+def _binreduce(values, starts, counts, function):
+    """
+    Applies function to each group of rows of values. Groups are contiguous, start at starts
+    and have counts rows. Empty groups get the result of function on an empty array.
+    """
+    import warnings
+
+    filled = counts > 0
+    out = np.full((len(counts),) + values.shape[1:], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if (~filled).any():
+            out[ ~filled ] = function(values[:0, 0] if values.ndim > 1 else values[:0])
+        if not filled.any():
+            return out
+
+        #-----------
+        # Means and numpy reductions are done all at once, other functions group by group
+        if function is np.mean:
+            red = np.add.reduceat(values, starts[ filled ], axis=0)
+            out[ filled ] = red / counts[ filled ].reshape((-1,) + (1,)*(values.ndim-1))
+        elif function in _bin_ufuncs:
+            out[ filled ] = _bin_ufuncs[ function ].reduceat(values, starts[ filled ], axis=0)
+        else:
+            for i in np.flatnonzero(filled):
+                group = values[ starts[i]:starts[i]+counts[i] ]
+                if values.ndim > 1:
+                    out[i] = [ function(group[:, j]) for j in range(values.shape[1]) ]
+                else:
+                    out[i] = function(group)
+        #-----------
+    return out
 
 
 def classbin(x, y, bins_number=100, function=np.mean, xfunction=np.mean, logscale=True):
@@ -303,12 +543,15 @@ def classbin(x, y, bins_number=100, function=np.mean, xfunction=np.mean, logscal
     Separates x and y inputs into bins based on the x array.
     x and y do not have to be ordered.
 
+    Each point is assigned to a bin at once (with numpy.searchsorted) and the bins are
+    reduced on the data sorted by bin, so the cost doesn't grow with the number of bins.
+
     Parameters
     -----------
     x: np.array
         independent variable
     y: np.array
-        dependent variable
+        dependent variable. If 2-D, each column is binned separately (with the same bins)
     bins_number: int
         number of classes (or bins) desired
     function: callable
@@ -321,40 +564,43 @@ def classbin(x, y, bins_number=100, function=np.mean, xfunction=np.mean, logscal
     np.array:
         x binned
     np.array:
-        y binned
+        y binned (one column per column of y, if y is 2-D)
     """
-    import warnings
-    import numpy as np
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    #-----------
+    # Gets rid of non-finite values in the x array and, if using a log-scale, of negative or zero values
+    valid = np.isfinite(x)
+    if logscale:
+        valid &= (x > 0)
+    if not valid.all():
+        x = x[ valid ]
+        y = y[ valid ]
+    #-----------
 
     xmin=np.min(x)
     xmax=np.max(x)
     if logscale:
-        #-----------
-        # The following if statement gets rid of negative or zero values in the x array, since we are using log-scale
-        if (x<=0).any():
-            y=np.array([ yy for yy, xx in zip(y,x) if xx > 0 ])
-            x=np.array([ el for el in x if el > 0])
-            xmin=np.min(x)
-            xmax=np.max(x)
-        #-----------
         bins=np.logspace(np.log(xmin), np.log(xmax), bins_number+1, base=np.e)
     else:
         bins=np.linspace(xmin, xmax, bins_number+1)
-    xsm = np.zeros(bins_number)
-    ysm = np.zeros(bins_number)
 
     #-----------
-    # The following process is what actually bins the data using numpy
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=RuntimeWarning)
-        for i in range(bins_number):
-            if i == bins_number - 1:
-                sel = bins[i] <= x
-            else:
-                sel = (bins[i] <= x) & (x < bins[i+1])
-            xsm[i] = xfunction(x[sel])
-            ysm[i] = function(y[sel])
+    # Bin i has bins[i] <= x < bins[i+1], except the last one which has every x >= bins[-2]
+    idx = np.searchsorted(bins, x, side='right') - 1
+    idx = np.minimum(idx, bins_number-1)
+    inside = idx >= 0
+    order = np.argsort(idx[ inside ], kind='stable')
+    idx = idx[ inside ][ order ]
+    xs = x[ inside ][ order ]
+    ys = y[ inside ][ order ]
+    counts = np.bincount(idx, minlength=bins_number)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
     #-----------
+
+    xsm = _binreduce(xs, starts, counts, xfunction)
+    ysm = _binreduce(ys, starts, counts, function)
     return xsm, ysm
 
 
@@ -398,8 +644,11 @@ def name2date(filename, dlconfig):
     """
     from itertools import zip_longest
     import datetime as dt
+    from .auxiliar import strip_compression
     
     filename_format=dlconfig.filename_format
+    if strip_compression(filename_format) == filename_format:
+        filename = strip_compression(filename)
     f=''.join([ s for s,v in zip_longest(filename, filename_format) if v!='?' ])
     fmt=filename_format.replace('?','')
     cdate=dt.datetime.strptime(f, fmt)
@@ -444,6 +693,46 @@ def line2date(line, dlconfig):
     return dt.datetime.strptime(s, datefmt)
 
 
+def lines2dates(lines, dlconfig):
+    """
+    Gets the dates of many lines of a file at once according to dataloggerConfig object.
+    Only the fields of each line up to the last date column are split off, and they are
+    parsed all together (see parseDates).
+
+    Parameters
+    ----------
+    lines: list
+        lines of file with dates inside
+    dlconfig: pymicra.dataloggerConfig
+        configuration of the datalogger
+
+    Returns
+    -------
+    pandas.DatetimeIndex
+        timestamps of the lines
+    """
+    import pandas as pd
+
+    date_col_names = dlconfig.date_col_names
+    date_cols = dlconfig.date_cols
+    sep = dlconfig.columns_separator
+    if sep=='whitespace':
+        sep = None
+    maxsplit = max(date_cols) + 1
+
+    #-------
+    # Splits only the beginning of each line
+    fields = [ line.split(sep, maxsplit) for line in lines ]
+    dates = pd.DataFrame({ name : [ field[col].strip().strip('"') for field in fields ]
+                            for name, col in zip(date_col_names, date_cols) })
+    #-------
+
+    index = _fastDates(dates, date_col_names)
+    if index is None:
+        index = pd.DatetimeIndex(_stringDates(dates, date_col_names, dlconfig.date_connector))
+    return index
+
+
 def diff_central(x, y):
     """
     Applies the central finite difference scheme
@@ -20,10 +20,15 @@ def divide(elems, units, inplace_units=False, unitdict=None, key=None):
 
 
 
+_operation_cache = {}
+
 def operate(elems, units, inplace_units=False, unitdict=None, key=None, operation='+'):
     """
     Operate on elements considering their units
 
+    The resulting unit is worked out with pint on scalars only (and cached for each
+    combination of units) and the numbers are calculated with numpy on the raw arrays.
+
     Parameters
     -----------
     elems: list, tuple
@@ -42,35 +47,45 @@ def operate(elems, units, inplace_units=False, unitdict=None, key=None, operatio
 
     idx = elems[0].index
 
-    if operation=='+':
-        result = elems[0].values*units[0]
-        for elem, unit in zip(elems[1:], units[1:]):
-            if type(elem) == pd.Series:
-                elem = elem.reindex(idx)
-                result += elem.values*unit
-            else:
-                result += elem*unit
-
-    if operation=='*':
-        result = elems[0].values*units[0]
-        for elem, unit in zip(elems[1:], units[1:]):
-            if type(elem) == pd.Series:
-                elem = elem.reindex(idx)
-                result *= elem.values*unit
-            else:
-                result *= elem*unit
-
-    if operation=='/':
-        result = elems[0].values*units[0]
-        for elem, unit in zip(elems[1:], units[1:]):
-            if type(elem) == pd.Series:
+    #-------
+    # Elements are aligned with the first one, but only reindexed if their index is different
+    values = []
+    for elem in elems:
+        if isinstance(elem, pd.Series):
+            if not elem.index.equals(idx):
                 elem = elem.reindex(idx)
-                result /= elem.values*unit
-            else:
-                result /= elem*unit
+            elem = elem.values
+        values.append(elem)
+    #-------
+
+    #-------
+    # The unit of the result and the factors that convert the elements to it
+    funit, factors = _operation_units(units, operation)
+    #-------
+
+    #-------
+    # Now the numbers, with the same precision as the first element
+    first = np.asarray(values[0])
+    if operation=='+':
+        scales, offset = factors
+        result = first*scales[0] if scales[0]!=1 else first
+        for elem, scale in zip(values[1:], scales[1:]):
+            result = result + (elem*scale if scale!=1 else elem)
+        if offset:
+            result = result + offset
+    else:
+        result = first
+        for elem in values[1:]:
+            if operation=='*':
+                result = result * elem
+            elif operation=='/':
+                result = result / elem
+    result = np.asarray(result)
+    if result.dtype.kind == 'f' and first.dtype.kind == 'f':
+        result = result.astype(first.dtype, copy=False)
+    #-------
 
-    out = pd.Series(result.magnitude, index=idx)
-    funit = result.units
+    out = pd.Series(result, index=idx)
 
     if inplace_units==True:
         unitdict.update({key : funit})
@@ -79,6 +94,51 @@ def operate(elems, units, inplace_units=False, unitdict=None, key=None, operatio
         return out, funit
 
 
+def _operation_units(units, operation):
+    """
+    Gets the unit resulting from an operation. For additions it also gets the scale that
+    brings each element to that unit and the offset of the result, so that the sum is
+    sum(scale*elem) + offset. These are taken from pint on scalars, so they're also right
+    for offset and delta units (e.g. degC + delta_degC) and raise the same errors as
+    operating on arrays would (e.g. adding incompatible units).
+    """
+    key = (operation,) + tuple(str(unit) for unit in units)
+    try:
+        return _operation_cache[key]
+    except KeyError:
+        pass
+
+    from .. import Q_
+
+    def probe(values):
+        result = Q_(values[0], units[0])
+        for value, unit in zip(values[1:], units[1:]):
+            if operation=='+':
+                result = result + Q_(value, unit)
+            elif operation=='*':
+                result = result * Q_(value, unit)
+            elif operation=='/':
+                result = result / Q_(value, unit)
+        return result
+
+    funit = probe([1.]*len(units)).units
+
+    if operation=='+':
+        #-------
+        # Pint adds one element at a time, but the whole sum is linear in each of them
+        offset = probe([0.]*len(units)).to(funit).magnitude
+        scales = []
+        for i in range(len(units)):
+            values = [0.]*len(units)
+            values[i] = 1.
+            scales.append(probe(values).to(funit).magnitude - offset)
+        factors = (scales, offset)
+        #-------
+    else:
+        factors = None
+    _operation_cache[key] = result = (funit, factors)
+    return result
+
 
 def parseUnits(unitstr):
     """
@@ -95,6 +155,147 @@ def parseUnits(unitstr):
         return { key: ureg[el].u for key, el in list(unitstr.items()) }
 
 
+_conversion_cache = {}
+
+def conversion_factors(inunit, outunit):
+    """
+    Gets the scale and offset that convert values from one unit to another, so that
+    out = scale*values + offset. Offsets are only non-zero for units such as degC.
+
+    Factors are computed with pint only once for each pair of units and then cached. If inunit
+    is a frozen unit (see frozen_units) the parsed outunit is also frozen.
+
+    Parameters
+    ----------
+    inunit: pint.unit or str
+        unit the values are in
+    outunit: pint.unit or str
+        unit to convert to
+
+    Returns
+    -------
+    scale: float
+    offset: float
+    outunit: pint.unit
+        outunit parsed with the UnitRegistry
+    """
+    from .. import Q_
+
+    #-------
+    # Frozen units (see frozen_units) give frozen units back
+    frozen = bool(_frozen_class) and isinstance(inunit, _frozen_class[0])
+    key = (str(inunit), str(outunit), frozen)
+    try:
+        return _conversion_cache[key]
+    except KeyError:
+        pass
+    #-------
+
+    if isinstance(outunit, str):
+        outunit = parseUnits(outunit)
+    offset = Q_(0., inunit).to(outunit).magnitude
+    scale = Q_(1., inunit).to(outunit).magnitude - offset
+    if frozen:
+        outunit = _freeze(outunit)
+    _conversion_cache[key] = factors = (scale, offset, outunit)
+    return factors
+
+
+_frozen_class = []
+_frozen_results = {}
+
+def frozen_units(units):
+    """
+    Returns a copy of a units dictionary whose units remember the results of their operations.
+    Multiplying, dividing or raising them to a power (with each other or with other units)
+    gives a unit that is computed by pint only the first time and then taken from a cache, as
+    is their string representation (used as key of the caches of conversion factors). This
+    makes the unit algebra of a pipeline that is applied to many runs with the same units
+    (see pymicra.unitPlan) cost nearly nothing after the first run.
+
+    Operations with numbers still give pint quantities, as usual.
+    """
+    return dict( (key, _freeze(unit)) for key, unit in units.items() )
+
+
+def _freeze(unit):
+    """
+    Turns a pint unit into a frozen unit (see frozen_units)
+    """
+    from .. import ureg
+
+    if not _frozen_class:
+        class frozenUnit(ureg.Unit):
+            def __str__(self):
+                try:
+                    return self.__dict__['_str']
+                except KeyError:
+                    self.__dict__['_str'] = string = super(frozenUnit, self).__str__()
+                    return string
+
+            def _memo(self, operation, other, reflected=False):
+                if not isinstance(other, ureg.Unit):
+                    return getattr(super(frozenUnit, self), operation)(other)
+                key = (operation, self._units, other._units)
+                try:
+                    return _frozen_results[key]
+                except KeyError:
+                    pass
+                first, second = (other._units, self._units) if reflected else (self._units, other._units)
+                result = frozenUnit(first * second if operation.endswith('mul__') else first / second)
+                _frozen_results[key] = result
+                return result
+
+            def __mul__(self, other):
+                return self._memo('__mul__', other)
+
+            def __rmul__(self, other):
+                return self._memo('__rmul__', other, reflected=True)
+
+            def __truediv__(self, other):
+                return self._memo('__truediv__', other)
+
+            def __rtruediv__(self, other):
+                return self._memo('__rtruediv__', other, reflected=True)
+
+            def __pow__(self, other):
+                key = ('__pow__', self._units, other)
+                try:
+                    return _frozen_results[key]
+                except (KeyError, TypeError):
+                    pass
+                result = super(frozenUnit, self).__pow__(other)
+                if isinstance(result, ureg.Unit):
+                    result = frozenUnit(result._units)
+                    _frozen_results[key] = result
+                return result
+
+            __hash__ = ureg.Unit.__hash__
+
+        _frozen_class.append(frozenUnit)
+
+    if isinstance(unit, _frozen_class[0]):
+        return unit
+    if isinstance(unit, str):
+        unit = parseUnits(unit)
+    return _frozen_class[0](unit._units)
+
+
+def _apply_factors(values, scale, offset):
+    """
+    Applies scale and offset to a numpy array, keeping its floating point precision
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        values = values.astype(float)
+    out = np.multiply(values, values.dtype.type(scale))
+    if offset:
+        out += values.dtype.type(offset)
+    return out
+
+
 def convert_to(data, inunit, outunit, inplace_units=False, key=None): 
     """ 
     Converts data from one unit to the other 
@@ -112,20 +313,17 @@ def convert_to(data, inunit, outunit, inplace_units=False, key=None):
     key: str 
         if inunit is a dict, it is the name of the variable to be changed 
     """ 
-    from .. import Q_ 
- 
     if key: 
-        Q = inunit[key].to(outunit) 
+        scale, offset, outunit = conversion_factors(inunit[key], outunit)
     else: 
-        Q = inunit.to(outunit) 
+        scale, offset, outunit = conversion_factors(inunit, outunit)
  
-    coef = Q.magnitude 
-    outunit = Q.units
+    data = data*scale + offset if offset else data*scale
     if inplace_units: 
         inunit.update({key : outunit}) 
-        return data*coef 
+        return data
     else: 
-        return data*coef, outunit 
+        return data, outunit 
 
 
 def convert_cols(data, guide, units, inplace_units=False):
@@ -143,31 +341,28 @@ def convert_cols(data, guide, units, inplace_units=False):
     inplace_units: bool 
         if inunit is a dict, the dict is update in place. "key" keyword must be provided 
     """ 
-    from .. import algs
-    from .. import Q_
-
     data = data.copy()
 
     #-------
     # An attempt to make it work with Series
     if len(data.columns)==1 and (type(guide) != dict):
         guide = { data.columns[0] : guide }
-    guide = algs.parseUnits(guide)
     #-------
 
     #-------
-    # We first turn it into a numpy array to make the conversion using pint natively
+    # Each column is converted with a multiply-add on its numpy array, with factors that
+    # are cached for each pair of units. Floating point columns keep their precision (e.g. float32)
+    outunits = {}
     for col, outunit in guide.items():
-        aux = Q_(data[ col ].values, units[ col ])
-        aux = aux.to(outunit)
-        data.loc[:, col] = aux
+        scale, offset, outunits[ col ] = conversion_factors(units[ col ], outunit)
+        data[ col ] = _apply_factors(data[ col ].values, scale, offset)
     #-------
         
     if inplace_units: 
-        units.update(guide) 
+        units.update(outunits) 
         return data 
     else: 
-        return data, guide 
+        return data, outunits 
 
 
 def convert_indexes(data, guide, units, inplace_units=False):
@@ -185,24 +380,21 @@ def convert_indexes(data, guide, units, inplace_units=False):
     inplace_units: bool 
         if inunit is a dict, the dict is update in place. "key" keyword must be provided 
     """ 
-    from .. import algs
-
     data = data.copy()
-    guide = algs.parseUnits(guide)
 
     #-------
-    # We first turn it into a numpy array to make the conversion using pint natively
+    # Uses the cached conversion factors for each element
+    outunits = {}
     for idx, outunit in guide.items():
-        aux = data[ idx ] * units[ idx ]
-        aux = aux.to(outunit)
-        data.loc[ idx ] = aux.magnitude
+        scale, offset, outunits[ idx ] = conversion_factors(units[ idx ], outunit)
+        data.loc[ idx ] = data[ idx ]*scale + offset
     #-------
         
     if inplace_units: 
-        units.update(guide) 
+        units.update(outunits) 
         return data 
     else: 
-        return data, guide 
+        return data, outunits 
 
 
 def with_units(data, units):
@@ -0,0 +1,366 @@
+"""
+Defines a persistent catalog of data files, which keeps the time span, number of lines and size
+of each file so that selections by date don't need to open the files
+"""
+
+
+class fileCatalog(object):
+    """
+    Catalog of data files stored in a SQLite database. For each file it keeps the path, size,
+    modification time, number of lines, the date in its name (if the fileConfig has a
+    filename_format) and the timestamps of its first and last lines.
+
+    The catalog is built incrementally: update() only scans files that are new or whose size
+    or modification time changed since they were last scanned, or that were scanned with a
+    fileConfig whose date columns, separator, skipped rows or filename format were different.
+    A catalog can be shared by threads (e.g. the ones reading files ahead of time).
+
+    Parameters
+    ----------
+    database: str
+        path of the SQLite file where the catalog is kept. Created if it doesn't exist.
+        ":memory:" keeps the catalog only in memory.
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files (or the path to a .config file)
+
+    Examples
+    --------
+    >>> cat = pm.fileCatalog('raw_data.db', fconfig)
+    >>> cat.update(glob('raw_data/*.csv'))
+    >>> files = cat.covering('2015-01-01 12:00', '2015-01-01 18:00')
+    >>> cat.gaps()
+    """
+
+    def __init__(self, database, fileconfig):
+        import sqlite3
+        import threading
+
+        if isinstance(fileconfig, str):
+            from . import fileConfig
+            fileconfig = fileConfig(fileconfig)
+        self.database = database
+        self.fileconfig = fileconfig
+
+        #------------
+        # The connection is shared by every thread, one statement at a time
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        #------------
+
+        with self._lock, self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS files (
+                                         path TEXT PRIMARY KEY,
+                                         size INTEGER,
+                                         mtime INTEGER,
+                                         lines INTEGER,
+                                         date TEXT,
+                                         first TEXT,
+                                         last TEXT,
+                                         config TEXT)''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS files_first ON files (first)')
+            columns = [ row[1] for row in self.connection.execute('PRAGMA table_info(files)') ]
+            if 'config' not in columns:
+                self.connection.execute('ALTER TABLE files ADD COLUMN config TEXT')
+
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM files')[0][0]
+
+
+    def __str__(self):
+        return '<pymicra.fileCatalog> of {} files at {}'.format(len(self), self.database)
+
+
+    def close(self):
+        """
+        Closes the connection to the database
+        """
+        with self._lock:
+            self.connection.close()
+
+
+    def _query(self, sql, params=()):
+        """
+        Runs a query holding the lock and returns all its rows
+        """
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of the options of the fileConfig used to scan the files
+        """
+        import hashlib
+
+        options = [ getattr(self.fileconfig, name, None) for name in
+                    ['date_cols', 'date_col_names', 'date_connector', 'columns_separator', 'skiprows', 'filename_format'] ]
+        return hashlib.sha1(repr(options).encode('utf-8')).hexdigest()
+
+
+    def update(self, files, verbose=False):
+        """
+        Scans files that are not in the catalog or that changed since they were last scanned
+
+        Parameters
+        ----------
+        files: list or str
+            list of paths (or a single path) of files to include in the catalog
+        verbose: bool
+            whether to print the name of each file scanned
+
+        Returns
+        -------
+        int
+            number of files scanned
+        """
+        import os
+
+        if isinstance(files, str):
+            files = [files]
+        fingerprint = self.fingerprint
+        known = dict( (path, (size, mtime, config)) for path, size, mtime, config in
+                       self._query('SELECT path, size, mtime, config FROM files') )
+
+        #------------
+        # Files are scanned without the lock, which is only held to write each one
+        scanned = 0
+        for fname in files:
+            path = os.path.abspath(fname)
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_size, stat.st_mtime_ns, fingerprint):
+                continue
+            if verbose: print('Scanning', path)
+            lines, date, first, last = self._scan(path)
+            with self._lock, self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (path, stat.st_size, stat.st_mtime_ns, lines, date, first, last, fingerprint))
+            scanned += 1
+        #------------
+        return scanned
+
+
+    def prune(self):
+        """
+        Removes from the catalog files that don't exist anymore
+
+        Returns
+        -------
+        int
+            number of files removed
+        """
+        import os
+
+        paths = [ path for (path,) in self._query('SELECT path FROM files') if not os.path.isfile(path) ]
+        with self._lock, self.connection:
+            self.connection.executemany('DELETE FROM files WHERE path=?', [ (path,) for path in paths ])
+        return len(paths)
+
+
+    def _scan(self, path):
+        """
+        Reads a file once, counting its lines and getting the timestamps of its first and last
+        lines of data. Timestamps that can't be determined are returned as None.
+        """
+        from os.path import basename
+        from . import algs
+
+        #------------
+        # Reads the file in blocks, keeping the first line after the header and the last line.
+        # Lines are counted as newline characters (like "wc -l")
+        skiprows = set(self.fileconfig.skiprows)
+        first_row = min(set(range(len(skiprows)+1)) - skiprows)
+        with algs.open_file(path, 'rb') as fin:
+            head = [ fin.readline() for i in range(first_row+1) ]
+            first = head[-1] or None
+            tail = b''.join(head)
+            lines = tail.count(b'\n')
+            for block in iter(lambda: fin.read(2**20), b''):
+                lines += block.count(b'\n')
+                tail = tail[-2**12:] + block
+        last = tail.rstrip(b'\r\n').rsplit(b'\n', 1)[-1] if first else None
+        #------------
+
+        #------------
+        # Gets the dates from the name and the contents of the file
+        try:
+            date = algs.name2date(basename(path), self.fileconfig).isoformat(' ')
+        except (TypeError, AttributeError, ValueError):
+            date = None
+
+        try:
+            index = algs.lines2dates([ line.decode() for line in (first, last) ], self.fileconfig)
+            first, last = [ str(stamp) for stamp in index ]
+        except (AttributeError, IndexError, TypeError, ValueError, UnicodeDecodeError):
+            first = last = None
+        #------------
+
+        return lines, date, first, last
+
+
+    def to_frame(self):
+        """
+        Returns the catalog as a pandas.DataFrame indexed by path and sorted by the first timestamp
+        """
+        import pandas as pd
+
+        with self._lock:
+            df = pd.read_sql_query('SELECT path, size, mtime, lines, date, first, last FROM files ORDER BY first, date, path',
+                    self.connection, index_col='path')
+        for col in ['date', 'first', 'last']:
+            df[col] = pd.to_datetime(df[col])
+        return df
+
+
+    def lines(self, files):
+        """
+        Returns the number of lines of each file as a dict. Files must have been cataloged.
+        """
+        return self._lookup(files, 'lines')
+
+
+    def dates(self, files):
+        """
+        Returns the date in the name of each file (or the timestamp of its first line, if the
+        name has no date) as a dict. Files must have been cataloged.
+        """
+        import pandas as pd
+
+        return dict( (path, pd.Timestamp(value) if value else None) for path, value
+                        in self._lookup(files, 'COALESCE(date, first)').items() )
+
+
+    def _lookup(self, files, column):
+        """
+        Gets one column of the catalog for a list of files, keyed by the paths as given
+        """
+        import os
+
+        values = dict(self._query('SELECT path, {} FROM files'.format(column)))
+        try:
+            return dict( (fname, values[os.path.abspath(fname)]) for fname in files )
+        except KeyError as e:
+            raise KeyError('{} is not in the catalog. Run update() first.'.format(e.args[0]))
+
+
+    def select(self, begin_date=None, end_date=None, files=None):
+        """
+        Selects files whose date is within an interval. The date of each file is the date in its
+        name (same as in qcontrol) or, if the name has no date, the timestamp of its first line.
+
+        Parameters
+        ----------
+        begin_date: str or datetime
+            files dated before this are left out
+        end_date: str or datetime
+            files dated after this are left out
+        files: list
+            if given, only files in this list are considered (they must have been cataloged)
+
+        Returns
+        -------
+        list
+            paths of the selected files sorted by date
+        """
+        df = self._restrict(files)
+        date = df.date.fillna(df['first'])
+        valid = self._between(date, date, begin_date, end_date)
+        return list(date[valid].sort_values(kind='mergesort').index)
+
+
+    def covering(self, begin_date=None, end_date=None, files=None):
+        """
+        Selects files with data inside an interval, based on the timestamps of their first
+        and last lines.
+
+        Parameters
+        ----------
+        begin_date: str or datetime
+            beginning of the interval
+        end_date: str or datetime
+            end of the interval
+        files: list
+            if given, only files in this list are considered (they must have been cataloged)
+
+        Returns
+        -------
+        list
+            paths of the files that overlap the interval sorted by their first timestamp
+        """
+        df = self._restrict(files).dropna(subset=['first', 'last'])
+        valid = self._between(df['last'], df['first'], begin_date, end_date)
+        return list(df.index[valid])
+
+
+    def gaps(self, tolerance=None, files=None):
+        """
+        Finds gaps in the data between consecutive files
+
+        Parameters
+        ----------
+        tolerance: str or pandas.Timedelta
+            smallest interval between the last line of a file and the first line of the next one
+            reported as a gap. Default is one and a half sampling periods (according to the
+            frequency of the fileConfig) or zero.
+        files: list
+            if given, only files in this list are considered (they must have been cataloged)
+
+        Returns
+        -------
+        pandas.DataFrame
+            one line per gap with its beginning, end, duration and the files before and after it
+        """
+        import pandas as pd
+
+        df = self._restrict(files).dropna(subset=['first', 'last'])
+        if tolerance is None:
+            freq = getattr(self.fileconfig, 'frequency', None)
+            tolerance = pd.Timedelta(seconds=1.5/freq) if freq else pd.Timedelta(0)
+        tolerance = pd.Timedelta(tolerance)
+
+        end = df['last'].cummax().shift(1)
+        duration = df['first'] - end
+        valid = duration > tolerance
+        return pd.DataFrame({ 'begin' : end[valid].values,
+                              'end' : df['first'][valid].values,
+                              'duration' : duration[valid].values,
+                              'before' : df.index.to_series().shift(1)[valid].values,
+                              'after' : df.index[valid] }, columns=['begin', 'end', 'duration', 'before', 'after'])
+
+
+    def _restrict(self, files):
+        """
+        Returns the catalog as a DataFrame restricted to a list of files, indexed by the paths as given
+        """
+        import os
+
+        df = self.to_frame()
+        if files is None:
+            return df
+        if isinstance(files, str):
+            files = [files]
+        paths = [ os.path.abspath(fname) for fname in files ]
+        missing = [ fname for fname, path in zip(files, paths) if path not in df.index ]
+        if missing:
+            raise KeyError('{} not in the catalog. Run update() first.'.format(missing))
+        names = dict(zip(paths, files))
+        df = df.loc[ [ path for path in df.index if path in names ] ]
+        df.index = [ names[path] for path in df.index ]
+        return df
+
+
+    @staticmethod
+    def _between(upper, lower, begin_date, end_date):
+        """
+        Returns a boolean mask where upper>=begin_date and lower<=end_date
+        """
+        import pandas as pd
+
+        valid = pd.Series(True, index=upper.index)
+        if begin_date is not None:
+            valid &= upper >= pd.Timestamp(begin_date)
+        if end_date is not None:
+            valid &= lower <= pd.Timestamp(end_date)
+        return valid.values
+
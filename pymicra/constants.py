@@ -3,7 +3,7 @@
 Defines some useful constants
 """
 from . import algs
-units={}    # creates units dictionary so it can be updated everytime a constant is added
+_units={}    # creates units dictionary so it can be updated everytime a constant is added
 
 #---------------------------------------
 # Gas constants
@@ -17,55 +17,55 @@ molar_mass={'dry' : 28.9645,
             'n2o' : 44.01280,
             'o' : 15.99940,
             'n' : 14.00670}
-units.update({'molar_mass' : 'g/mol'})
+_units.update({'molar_mass' : 'g/mol'})
    
 R=8.3144621    # universal gas constant J/(mol.K)
-units.update({'R' : 'J/(mol * K)'})
+_units.update({'R' : 'J/(mol * K)'})
 
 R_spec={}
 for key, val in molar_mass.items():
     R_spec.update( {key : R/val} )
 del key, val
-units.update({'R_spec' : 'J/(g * K)'})
+_units.update({'R_spec' : 'J/(g * K)'})
 
-units.update({'mu':'dimensionless'})
+_units.update({'mu':'dimensionless'})
 
 cp_dry=1.0035  # specific heat of dry air at constant pressure
-units.update({'cp_dry' : 'J/(g * K)'})
+_units.update({'cp_dry' : 'J/(g * K)'})
 
 cp_h2o=4.1813  # specific heat of water vapor at constant pressure
-units.update({'cp_water' : 'J/(g * K)'})
+_units.update({'cp_water' : 'J/(g * K)'})
 
 from .physics import latent_heat_water
-units.update({'latent_heat_water' : 'J/g'})
+_units.update({'latent_heat_water' : 'J/g'})
 
 from .physics import satWaterPressure
-units['satWaterPressure'] = 'kPa'
+_units['satWaterPressure'] = 'kPa'
 
 
 #---------------------------------------
 # physical constants
 #---------------------------------------
 gravity=9.80665      # gravity
-units.update({'gravity':'m/(s**2)'})
+_units.update({'gravity':'m/(s**2)'})
 
 omega = 7.29212E-5  # angular velocity of the earth
-units.update({'omega' : '1/s'})
+_units.update({'omega' : '1/s'})
 
 earth_radius=6378140.0 # meters
-units.update({'earth_radius' :'m'})
+_units.update({'earth_radius' :'m'})
 
 standard_pressure = 101325.00 # pascals
-units.update({'standard_pressure':'Pa'})
+_units.update({'standard_pressure':'Pa'})
 
 standard_temperature = 288.15 # kelvin
-units.update({'standard_temperature':'K'})
+_units.update({'standard_temperature':'K'})
 
 temperature_lapse_rate = -0.0065 # change in temperature with height, kelvin/metre
-units.update({'temperature_lapse_rate' : 'K/m'})
+_units.update({'temperature_lapse_rate' : 'K/m'})
 
 earth_atmosphere_molar_mass =28.9644 # g/mol
-units.update({'earth_atmosphere_molar_mass' : 'g/mol' })
+_units.update({'earth_atmosphere_molar_mass' : 'g/mol' })
 
 
 #---------------------------------------
@@ -150,5 +150,13 @@ except:
 
 #---------------
 # Parse units to pint!
-units = algs.parseUnits(units)
+def __getattr__(name):
+    """
+    The units of the constants are only parsed when first used, since that creates the UnitRegistry
+    """
+    global units
+    if name == 'units':
+        units = algs.parseUnits(_units)
+        return units
+    raise AttributeError("module 'pymicra.constants' has no attribute '{}'".format(name))
 #---------------
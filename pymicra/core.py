@@ -13,7 +13,7 @@ class fileConfig(object):
     ----------
     from_file: str
         path of .cfg file (configuration file) to read from. This will ignore all other
-        keywords.
+        keywords. The file can only assign python literals (see pymicra.read_fileConfig).
     variables: list of strings or dict
         If a list: should be a list of strings with the names of the variables. If the variable
         is part if the date, then it should be provided as a datetime directive,
@@ -42,6 +42,9 @@ class fileConfig(object):
         the units in which they appear.
     description: string
         brief description of the datalogger configuration file.
+    dtype: str or numpy.dtype
+        dtype with which the measurement (non-date) columns are read. E.g. "float32" halves the
+        memory used by the data. Default is None (pandas' default, float64).
     varNames: DEPRECATED
         use variables now.
     """
@@ -60,7 +63,8 @@ class fileConfig(object):
             skiprows=None,
             varNames=None,
             header=None,
-            description='Type help(fileConfig) to read intructions', **read_csv_kwargs):
+            description='Type help(fileConfig) to read intructions',
+            dtype=None, **read_csv_kwargs):
         """
         Reads the arguments, transforms them into attributes of the object and calcultes some
         other attributes.
@@ -136,6 +140,26 @@ class fileConfig(object):
         self.skiprows = list(set(self.skiprows) | set(self.header_lines))
 
 
+    def __getstate__(self):
+        """
+        Units are pickled as strings, since pint units can only be unpickled in the
+        registry in which they were created. This makes fileConfig objects cheap to
+        send to worker processes.
+        """
+        state = self.__dict__.copy()
+        if isinstance(state.get('units'), dict):
+            state['units'] = { key : str(unit) for key, unit in state['units'].items() }
+        return state
+
+
+    def __setstate__(self, state):
+        from . import algs
+
+        if isinstance(state.get('units'), dict):
+            state = dict(state, units=algs.parseUnits(state['units']))
+        self.__dict__.update(state)
+
+
     def __str__(self):
         return '<pymicra.fileConfig>\n{}'.format(self.description)
     __repr__ = __str__
@@ -76,7 +76,7 @@ def rotate2D(data, notation=None):
     Returns
     -------
     pandas.DataFrame
-        the complete data input with the wind components rotated
+        a copy of the input data with the wind components rotated
     """
     from math import atan2, sqrt
     import numpy as np
@@ -97,7 +97,8 @@ def rotate2D(data, notation=None):
     #-------
 
     #-------
-    # Definition of rotation matrix
+    # Definition of rotation matrix (calculated in double precision and then cast to the
+    # precision of the wind data, so that the rotated data keeps its dtype)
     DC= np.zeros((3,3))
     DC[0,0],DC[0,1],DC[0,2] = np.cos(alpha)*np.cos(beta), np.cos(beta)*np.sin(alpha),-np.sin(beta)
     DC[1,0],DC[1,1],DC[1,2] =-np.sin(alpha)          , np.cos(alpha)          , 0.
@@ -105,8 +106,10 @@ def rotate2D(data, notation=None):
     #-------
 
     #-------
-    # Application of rotation as a matrix product
-    data[wind_vars] = np.dot(DC, data[wind_vars].values.T).T
+    # Application of rotation as a matrix product. The input data isn't modified
+    dtype = algs.float_dtype(data[wind_vars])
+    data = data.copy()
+    data[wind_vars] = np.dot(data[wind_vars].to_numpy(dtype=dtype), DC.T.astype(dtype))
     #-------
 
     return data
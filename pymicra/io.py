@@ -9,7 +9,7 @@ Defines some useful functions to aid on the input/output of data
 # INPUT OF DATA
 #-------------------------------------------
 #-------------------------------------------
-def readDataFile(fname, variables=None, only_named_cols=True, **kwargs):
+def readDataFile(fname, variables=None, only_named_cols=True, dtype=None, **kwargs):
     """
     Reads one datafile using pandas.read_csv()
 
@@ -19,9 +19,13 @@ def readDataFile(fname, variables=None, only_named_cols=True, **kwargs):
         keys are columns and values are names of variable
     only_named_columns: bool
         if True, don't read columns that don't appear on variables' keys
+    dtype: str or numpy.dtype
+        dtype of the measurement (non-date) columns. E.g. "float32". If None, pandas' default is used.
     kwargs: dict
         dictionary with kwargs of pandas' read_csv function
         see http://pandas.pydata.org/pandas-docs/stable/generated/pandas.read_csv.html for more detail
+        If chunksize is among them, a generator of DataFrames is returned.
+        Files compressed with gzip, bz2, xz or zstd are decompressed as they are read.
     variables: list or dict
         list or dictionary containing the names of each variable in the file (if dict, the keys must be ints)
         
@@ -31,6 +35,13 @@ def readDataFile(fname, variables=None, only_named_cols=True, **kwargs):
         pandas.DataFrame object
     """
     import pandas as pd
+    from . import algs
+
+    #------------
+    # Compressed files are identified by their contents, not only by their extension
+    if isinstance(fname, str) and 'compression' not in kwargs:
+        kwargs['compression'] = algs.compression(fname)
+    #------------
 
     #------------
     # This makes it easier to read dates
@@ -40,6 +51,13 @@ def readDataFile(fname, variables=None, only_named_cols=True, **kwargs):
         dtypes=None
     #------------
 
+    #------------
+    # Measurement columns are read directly with the chosen precision
+    if dtype is not None:
+        dtypes = dict(dtypes or {})
+        dtypes.update({ key : dtype for key, name in variables.items() if r'%' not in name })
+    #------------
+
     #------------
     # If only_named_cols == True, read all columns in the file
     if not only_named_cols:
@@ -61,14 +79,111 @@ def readDataFile(fname, variables=None, only_named_cols=True, **kwargs):
     #------------
 
     #------------
-    # Renaming columns according to our variables
+    # If the file is read in chunks, rename each chunk as it is read
+    if kwargs.get('chunksize'):
+        if dtype is not None:
+            return ( algs.astype_floats(chunk, dtype).rename(columns = variables) for chunk in data )
+        return ( chunk.rename(columns = variables) for chunk in data )
+    #------------
+
+    #------------
+    # Renaming columns according to our variables (and making sure of the precision,
+    # since the dtypes may have been ignored above)
+    if dtype is not None:
+        data = algs.astype_floats(data, dtype)
     data = data.rename(columns = variables)
     #------------
 
     return data
 
 
-def readDataFiles(flist, verbose=0, **kwargs):
+def _readDataFileWorker(fname, read_kw={}, parse_dates_kw=None, cache_dir=None):
+    """
+    Reads one datafile and, if parse_dates_kw is given, parses its dates.
+    Defined at module level so that it can be sent to worker processes.
+
+    If cache_dir is given the result is loaded from (or saved to) the on-disk cache.
+    """
+    from . import algs
+
+    if cache_dir:
+        cpath, stamp=_cache_entry(fname, cache_dir, read_kw, parse_dates_kw)
+        data=_read_cache(cpath, stamp)
+        if data is not None:
+            return data
+
+    data=readDataFile(fname, **read_kw)
+    if parse_dates_kw is not None:
+        data=algs.parseDates(data, **parse_dates_kw)
+
+    if cache_dir:
+        _write_cache(cpath, stamp, data)
+    return data
+
+
+def _cache_entry(fname, cache_dir, read_kw, parse_dates_kw):
+    """
+    Returns the path of the cache entry of a file and the stamp that validates it.
+
+    The path depends on the absolute path of the file and on the keywords used to read it
+    and parse its dates (which carry the fileConfig). The stamp is the size and modification
+    time of the file, which is part of the name of the entry, so entries of files that changed
+    are automatically invalidated.
+    """
+    import os
+    import hashlib
+
+    fname=os.path.abspath(fname)
+    keywords=[ sorted( (key, repr(val)) for key, val in kw.items() ) for kw in [read_kw, parse_dates_kw or {}] ]
+    key=hashlib.sha1(repr((fname, keywords, parse_dates_kw is None)).encode('utf-8')).hexdigest()
+
+    stat=os.stat(fname)
+    stamp=(stat.st_size, stat.st_mtime_ns)
+    return os.path.join(cache_dir, '{}-{}-{}.npz'.format(key, *stamp)), stamp
+
+
+def _read_cache(cpath, stamp):
+    """
+    Returns the data in a cache entry if the entry exists and is valid. Returns None otherwise.
+
+    Entries are written with to_units, which stores plain arrays and json, so that loading them
+    (from a possibly shared directory) never unpickles anything.
+    """
+    import zipfile
+
+    try:
+        data, units=read_units(cpath, parse_units=False)
+    except (IOError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    return data
+
+
+def _write_cache(cpath, stamp, data):
+    """
+    Writes data to a cache entry, removing the entries of previous versions of the same file.
+    The file is moved into place only when complete so that concurrent readers never see a
+    partial entry.
+    """
+    import os
+    from glob import glob
+
+    cache_dir=os.path.dirname(cpath)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp='{}.{}.tmp.npz'.format(cpath, os.getpid())
+    to_units(data, {}, tmp)
+    os.replace(tmp, cpath)
+
+    key=os.path.basename(cpath).split('-')[0]
+    for old in glob(os.path.join(cache_dir, key+'-*.npz')):
+        if (old!=cpath) and not old.endswith('.tmp.npz'):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def readDataFiles(flist, verbose=0, n_jobs=1, executor=None, parse_dates_kw=None, cache_dir=None, **kwargs):
     """
     Reads data from a list of files by calling readDataFile individually for each entry
 
@@ -78,6 +193,18 @@ def readDataFiles(flist, verbose=0, **kwargs):
         files to be parsed
     verbose: bool
         whether to print
+    n_jobs: int
+        number of worker processes with which to parse the files. If 1 (default) files are read
+        serially. If -1 or None, use as many workers as there are processors.
+    executor: concurrent.futures.Executor
+        executor with which to parse the files. If given, n_jobs is ignored and the executor
+        is not shut down at the end.
+    parse_dates_kw: dict
+        if given, the dates of each file are parsed (with algs.parseDates and these keywords)
+        right after it is read, so that this is also done by the workers
+    cache_dir: str
+        if given, the parsed data of each file is cached in this directory and loaded from there
+        on subsequent reads. Entries are invalidated when the file or the keywords change.
     **kwargs:
         readDataFile kwargs
 
@@ -87,26 +214,60 @@ def readDataFiles(flist, verbose=0, **kwargs):
         data
     """
     import pandas as pd
+    from functools import partial
 
     if len(flist)==0:
         raise ValueError('Passed a list of files of zero length to be read.')
-    dflist=[]
-    for f in flist:
-        if verbose==1:
-            print('Reading',f)
-        subdata=readDataFile(f, **kwargs)
-        dflist.append(subdata)
+    reader=partial(_readDataFileWorker, read_kw=kwargs, parse_dates_kw=parse_dates_kw, cache_dir=cache_dir)
+
+    #------------
+    # Files are read either serially or by a pool of workers. Either way results come in file order
+    if (executor is None) and (n_jobs==1):
+        dflist=[]
+        for f in flist:
+            if verbose==1:
+                print('Reading',f)
+            dflist.append(reader(f))
+    else:
+        if verbose:
+            print('Reading {} files in parallel'.format(len(flist)))
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            if n_jobs==-1: n_jobs=None
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                dflist=list(pool.map(reader, flist))
+        else:
+            dflist=list(executor.map(reader, flist))
+    #------------
+
     if verbose:
         print('Concatenating DataFrames...')
-    data=pd.concat(dflist, ignore_index=True)
+    data=pd.concat(dflist, ignore_index=(parse_dates_kw is None))
     if verbose:
         print('Done!')
     return data
 
 
 
+def _get_read_kw(datalogger, only_named_cols=True, **read_data_kw):
+    """
+    Returns the keywords with which readDataFile reads the files described by a fileConfig
+    """
+    read_kw=dict(header=None, skiprows=datalogger.skiprows, variables=datalogger.variables,
+            only_named_cols=only_named_cols)
+    if getattr(datalogger, 'dtype', None) is not None:
+        read_kw['dtype']=datalogger.dtype
+    if datalogger.columns_separator=='whitespace':
+        read_kw['delim_whitespace']=True
+    else:
+        read_kw['sep']=datalogger.columns_separator
+    read_kw.update(read_data_kw)
+    return read_kw
+
+
 def timeSeries(flist, datalogger, parse_dates=True, verbose=False,
-        read_data_kw={}, parse_dates_kw={}, clean_dates=True, return_units=True, only_named_cols=True):
+        read_data_kw={}, parse_dates_kw={}, clean_dates=True, return_units=True, only_named_cols=True,
+        n_jobs=1, executor=None, cache_dir=None, begin_date=None, end_date=None, catalog=None, dtype=None):
     """
     Creates a micrometeorological time series from a file or list of files.
 
@@ -122,6 +283,25 @@ def timeSeries(flist, datalogger, parse_dates=True, verbose=False,
         (i.d. there are repeated timestamps)
     verbose: int, bool
         verbose level
+    n_jobs: int
+        number of worker processes used to read (and parse the dates of) the files. Output
+        is identical to the serial one. See readDataFiles.
+    executor: concurrent.futures.Executor
+        executor used to read the files. If given, n_jobs is ignored.
+    cache_dir: str
+        directory of an on-disk cache of parsed files. If given, each file is read and has its
+        dates parsed only once; subsequent calls load it from the cache. An entry is
+        invalidated if the file (size or modification time) or the fileConfig change.
+    begin_date: str or datetime
+        if given (and parse_dates==True), data before this date is left out
+    end_date: str or datetime
+        if given (and parse_dates==True), data after this date is left out
+    catalog: pymicra.fileCatalog
+        if given along with begin_date or end_date, only files that the catalog says have data
+        between these dates are read (the catalog is updated with flist first).
+    dtype: str or numpy.dtype
+        dtype of the measurement (non-date) columns. E.g. "float32" halves the memory used.
+        Default is the dtype of the fileConfig.
 
     Returns
     -------
@@ -135,30 +315,57 @@ def timeSeries(flist, datalogger, parse_dates=True, verbose=False,
     #--------------
     # If datalogger is a string it should be the path to a .dlc file
     if isinstance(datalogger, str):
-        datalogger = read_dlc(datalogger)
+        datalogger = read_fileConfig(datalogger)
     #--------------
     
     #------------
     # We read the file(s)
     if isinstance(flist, str):
         flist=[flist]
+    if (catalog is not None) and (begin_date is not None or end_date is not None):
+        catalog.update(flist)
+        flist = catalog.covering(begin_date, end_date, files=flist)
+        if not flist:
+            raise ValueError('No files with data between {} and {}'.format(begin_date, end_date))
     header_lines=datalogger.header_lines
-    skiprows=datalogger.skiprows
-    columns_separator=datalogger.columns_separator
+    read_kw=_get_read_kw(datalogger, only_named_cols=only_named_cols, **read_data_kw)
+    if dtype is not None:
+        read_kw['dtype']=dtype
+    #------------
 
-    if columns_separator=='whitespace':
-        timeseries=readDataFiles(flist, header=None, skiprows=skiprows, delim_whitespace=True, 
-            variables = datalogger.variables, only_named_cols=only_named_cols, **read_data_kw)
+    #------------
+    # If files are read in parallel or cached, the dates are parsed file by file
+    if parse_dates and ((n_jobs!=1) or (executor is not None) or cache_dir):
+        if verbose: print('Reading files and parsing the dates file by file')
+        #------------
+        # Workers get the same keywords parseDates takes from the fileConfig in the serial path
+        parse_kw=dict(parse_dates_kw, date_col_names=datalogger.date_col_names)
+        if parse_kw.get('frequency') is None:
+            parse_kw['frequency']=getattr(datalogger, 'frequency', None)
+        #------------
+        timeseries=readDataFiles(flist, n_jobs=n_jobs, executor=executor, 
+            parse_dates_kw=parse_kw, cache_dir=cache_dir, **read_kw)
+
+    #------------
+    # Otherwise we read everything and then parse the dates
     else:
-        timeseries=readDataFiles(flist, header=None, skiprows=skiprows, sep=columns_separator, 
-            variables = datalogger.variables, only_named_cols=only_named_cols, **read_data_kw)
+        timeseries=readDataFiles(flist, n_jobs=n_jobs, executor=executor, cache_dir=cache_dir, **read_kw)
+        if parse_dates:
+            if verbose: print('Starting to parse the dates')
+            timeseries=algs.parseDates(timeseries, dataloggerConfig=datalogger, **parse_dates_kw)
     #------------
 
     #------------
-    # We parse de dates
-    if parse_dates:
-        if verbose: print('Starting to parse the dates')
-        timeseries=algs.parseDates(timeseries, dataloggerConfig=datalogger, **parse_dates_kw)
+    # Data outside the date range is left out
+    if parse_dates and (begin_date is not None or end_date is not None):
+        import numpy as np
+        import pandas as pd
+        valid = np.ones(len(timeseries), dtype=bool)
+        if begin_date is not None:
+            valid &= timeseries.index >= pd.Timestamp(begin_date)
+        if end_date is not None:
+            valid &= timeseries.index <= pd.Timestamp(end_date)
+        timeseries = timeseries[valid]
     #------------
 
     #------------
@@ -174,7 +381,613 @@ def timeSeries(flist, datalogger, parse_dates=True, verbose=False,
         return timeseries
 
 
-def read_fileConfig(dlcfile):
+def _prefetch(func, items, depth=1):
+    """
+    Applies func to each item of items in a background thread, yielding the futures in order.
+    Up to depth items beyond the one being consumed are processed ahead of time, so that
+    reading the next files overlaps with processing the current one.
+
+    Exceptions raised by func are only raised when the result of its future is requested.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from collections import deque
+
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) > depth:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def iterFiles(flist, fileconfig, depth=1, **kwargs):
+    """
+    Reads a list of files one at a time, reading the next files in a background thread
+    while the current one is processed.
+
+    Parameters
+    ----------
+    flist: list or string
+        list of files or the name of one file
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files (or the path to a .config file)
+    depth: int
+        number of files read ahead of the one being processed. Each of them is kept in memory.
+    kwargs: dict
+        keywords to pass to timeSeries
+
+    Yields
+    ------
+    str
+        name of the file
+    pandas.DataFrame
+        data contained in the file
+    dict
+        units of the data
+
+    Examples
+    --------
+    >>> for fname, data, units in pm.iterFiles(filelist, fconfig, depth=2):
+    ...     results = process(data, units)
+    """
+    from functools import partial
+
+    if isinstance(flist, str):
+        flist=[flist]
+    if isinstance(fileconfig, str):
+        from .core import fileConfig
+        fileconfig = fileConfig(fileconfig)
+    kwargs['return_units']=True
+
+    read = partial(timeSeries, datalogger=fileconfig, **kwargs)
+    for fname, future in zip(flist, _prefetch(read, flist, depth=depth)):
+        data, units = future.result()
+        yield fname, data, units
+
+
+def iterRuns(flist, fileconfig, rule='30min', chunksize=None, verbose=False,
+        read_data_kw={}, parse_dates_kw={}, only_named_cols=True, prefetch=0):
+    """
+    Reads a list of files lazily and yields one DataFrame per averaging interval.
+
+    Intervals that straddle two files (or two chunks of a file) are stitched together
+    before being yielded, so only one file (or chunk) plus one interval is kept in memory
+    at any time. Data must be in chronological order across files. Intervals without any
+    data are not yielded.
+
+    Parameters
+    ----------
+    flist: list or string
+        list of files (in chronological order) or the name of one file
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files (or the path to a .config file)
+    rule: str
+        pandas offset string defining the averaging intervals. E.g. '30min'. Must be a fixed
+        frequency (so '1D' works but calendar frequencies such as 'MS' or 'W' don't).
+    chunksize: int
+        if given, files are read in chunks of this many lines instead of one whole file at a time
+    verbose: bool
+        whether to print the name of each file as it is read
+    read_data_kw: dict
+        keywords to pass to readDataFile
+    parse_dates_kw: dict
+        keywords to pass to algs.parseDates
+    only_named_cols: bool
+        if True, don't read columns that don't appear on the variables of fileconfig
+    prefetch: int
+        if larger than zero (and chunksize is None), this many files are read ahead in a
+        background thread while the current one is processed (see iterFiles)
+
+    Yields
+    ------
+    pandas.DataFrame
+        data of one averaging interval indexed by date. Units are the ones in fileconfig.units
+    """
+    from . import algs
+    import pandas as pd
+    import numpy as np
+
+    #--------------
+    # If fileconfig is a string it should be the path to a .config file
+    if isinstance(fileconfig, str):
+        from .core import fileConfig
+        fileconfig = fileConfig(fileconfig)
+    if isinstance(flist, str):
+        flist=[flist]
+    #--------------
+
+    #--------------
+    # Intervals are found with floor, which only works for fixed frequencies
+    try:
+        pd.tseries.frequencies.to_offset(rule).nanos
+    except ValueError:
+        raise ValueError("rule must be a fixed frequency such as '30min' or '1D', not {!r}".format(rule))
+    #--------------
+
+    read_kw=_get_read_kw(fileconfig, only_named_cols=only_named_cols, **read_data_kw)
+    if chunksize:
+        read_kw['chunksize']=chunksize
+    date_cols=fileconfig.date_col_names
+
+    #--------------
+    # Generator of date-indexed pieces of data (whole files or chunks of files)
+    def parse(chunk):
+        chunk=algs.parseDates(chunk, dataloggerConfig=fileconfig, **parse_dates_kw)
+        return chunk[ [ col for col in chunk.columns if col not in date_cols ] ]
+
+    def read(fname):
+        if verbose: print('Reading', fname)
+        return parse(readDataFile(fname, **read_kw))
+
+    def pieces():
+        if prefetch and not chunksize:
+            for future in _prefetch(read, flist, depth=prefetch):
+                yield future.result()
+            return
+        for fname in flist:
+            if verbose: print('Reading', fname)
+            chunks=readDataFile(fname, **read_kw)
+            if not chunksize:
+                chunks=[ chunks ]
+            for chunk in chunks:
+                yield parse(chunk)
+    #--------------
+
+    #--------------
+    # Every interval except the last one of each piece is complete. The last one is carried
+    # over and completed with the beginning of the next piece
+    carry=None
+    for piece in pieces():
+        if carry is not None:
+            piece=pd.concat([carry, piece])
+        if len(piece)==0:
+            continue
+        labels=piece.index.floor(rule).values
+        bounds=np.concatenate([ [0], np.flatnonzero(labels[1:] != labels[:-1]) + 1 ])
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            yield piece.iloc[ begin:end ]
+        carry=piece.iloc[ bounds[-1]: ]
+    #--------------
+
+    if (carry is not None) and len(carry):
+        yield carry
+
+
+#---------
+# Campbell Sci's binary data types: (numpy dtype, number of bytes)
+# ASCII(n) fields are treated separately
+_TOB_TYPES = {
+    'IEEE4' : ('<f4', 4), 'IEEE4L' : ('<f4', 4), 'IEEE4B' : ('>f4', 4),
+    'IEEE8' : ('<f8', 8), 'IEEE8L' : ('<f8', 8), 'IEEE8B' : ('>f8', 8),
+    'FP2' : ('>u2', 2),
+    'ULONG' : ('<u4', 4), 'LONG' : ('<i4', 4),
+    'UINT2' : ('>u2', 2), 'INT2' : ('>i2', 2),
+    'UINT4' : ('>u4', 4), 'INT4' : ('>i4', 4),
+    'BOOL' : ('u1', 1), 'BOOL2' : ('>u2', 2), 'BOOL4' : ('>u4', 4),
+    'SecNano' : ('<u4', 8), 'NSec' : ('>u4', 8),
+}
+
+# Resolution in seconds of the sub-second part of TOB3 frame times
+_TOB3_RESOLUTIONS = {
+    'SecMsec' : 1e-3, 'Sec10Usec' : 1e-5, 'Sec100Usec' : 1e-4,
+    'SecUsec' : 1e-6, 'Sec100Nsec' : 1e-7,
+}
+
+# Units commonly written by Campbell Sci's loggers that pint doesn't understand
+_TOB_UNITS = { 'Deg C' : 'celsius', 'deg C' : 'celsius', 'degC' : 'celsius', 'Deg' : 'degree', 'deg' : 'degree' }
+
+# Campbell Sci's timestamps are seconds since 1990
+_CAMPBELL_EPOCH = '1990-01-01'
+#---------
+
+
+def _readTOBHeader(fname):
+    """
+    Reads the ASCII header of a TOB1 or TOB3 file
+
+    Returns
+    -------
+    dict
+        with the file type, the lines of the header (already split) and the size in bytes of the header
+    """
+    import csv
+    from . import algs
+
+    with algs.open_file(fname, 'rb') as fin:
+        first = fin.readline()
+        ftype = first.decode('ascii', 'replace').split(',')[0].strip().strip('"')
+        if ftype == 'TOB1':
+            nlines = 5
+        elif ftype == 'TOB3':
+            nlines = 6
+        else:
+            raise ValueError('{} is not a TOB1 or TOB3 file (file type is "{}")'.format(fname, ftype))
+        lines = [first] + [ fin.readline() for i in range(nlines-1) ]
+        size = fin.tell()
+    lines = list(csv.reader([ line.decode('ascii', 'replace').strip() for line in lines ]))
+    return dict(type=ftype, lines=lines, size=size)
+
+
+def _tobDtype(names, types):
+    """
+    Creates a numpy structured dtype for the records of a TOB file. Fields that take two
+    numbers (such as NSec) are split into "<name>_seconds" and "<name>_nanoseconds".
+    """
+    import numpy as np
+
+    fields = []
+    for name, tp in zip(names, types):
+        tp = tp.strip()
+        if tp.startswith('ASCII'):
+            fields.append((name, 'S{}'.format(int(tp[6:-1]))))
+        elif tp in ['SecNano', 'NSec']:
+            dtp = _TOB_TYPES[tp][0]
+            fields += [ (name+'_seconds', dtp), (name+'_nanoseconds', dtp) ]
+        else:
+            try:
+                fields.append((name, _TOB_TYPES[tp][0]))
+            except KeyError:
+                raise TypeError('Data type {} of field {} is not supported'.format(tp, name))
+    return np.dtype(fields)
+
+
+def _decodeFP2(raw):
+    """
+    Decodes Campbell Sci's 2-byte floating point format (FP2) to float32.
+
+    The 16 bits are: sign (1 bit), negative decimal exponent (2 bits) and mantissa (13 bits),
+    so that value = (-1)**sign * mantissa / 10**exponent. Some mantissas encode +-INF and NaN.
+
+    Parameters
+    ----------
+    raw: numpy.array
+        array of unsigned 16-bit integers (as read from the file)
+
+    Returns
+    -------
+    numpy.array
+        decoded values
+    """
+    import numpy as np
+
+    raw = np.asarray(raw, dtype=np.uint16)
+    sign = np.where(raw & 0x8000, -1., 1.).astype(np.float32)
+    exponent = (raw >> 13) & 0x3
+    mantissa = (raw & 0x1FFF).astype(np.float32)
+    values = sign * mantissa / np.array([1., 10., 100., 1000.], dtype=np.float32)[exponent]
+
+    #---------
+    # Special values
+    values[ raw == 0x1FFF ] = np.inf
+    values[ raw == 0x9FFF ] = -np.inf
+    values[ raw == 0x9FFE ] = np.nan
+    #---------
+    return values
+
+
+def _tobInterval(string):
+    """
+    Converts a TOB3 record interval (e.g. "100 MSEC") to nanoseconds
+    """
+    factors = { 'NSEC' : 1, 'USEC' : 10**3, 'MSEC' : 10**6, 'SEC' : 10**9, 'MIN' : 60*10**9, 'HR' : 3600*10**9 }
+    value, unit = string.split()
+    return int(round(float(value)*factors[unit.upper()]))
+
+
+def _mapTOB(fname, header, dtype):
+    """
+    Maps the binary part of a TOB file as an array of dtype. Uncompressed files are mapped
+    with numpy.memmap, while compressed ones are decompressed to memory.
+    """
+    import os
+    import numpy as np
+    from . import algs
+
+    if algs.compression(fname) is None:
+        n = (os.path.getsize(fname) - header['size']) // dtype.itemsize
+        return np.memmap(fname, dtype=dtype, mode='r', offset=header['size'], shape=(n,))
+    else:
+        with algs.open_file(fname, 'rb') as fin:
+            fin.read(header['size'])
+            buf = fin.read()
+        return np.frombuffer(buf, dtype=dtype, count=len(buf) // dtype.itemsize)
+
+
+def _readTOB1(fname, header, rec_dtype):
+    """
+    Reads the records of a TOB1 file and their timestamps (if the file has SECONDS and NANOSECONDS fields)
+    """
+    import numpy as np
+
+    records = _mapTOB(fname, header, rec_dtype)
+    names = rec_dtype.names
+    if 'SECONDS' in names:
+        nanosecs = records['SECONDS'].astype(np.int64)*10**9
+        if 'NANOSECONDS' in names:
+            nanosecs += records['NANOSECONDS']
+        dates = np.datetime64(_CAMPBELL_EPOCH, 'ns') + nanosecs.astype('timedelta64[ns]')
+    else:
+        dates = None
+    return records, dates, None
+
+
+def _readTOB3(fname, header, rec_dtype):
+    """
+    Reads the records of a TOB3 file, dropping frames that are empty, marked for removal or whose
+    footer doesn't match the validation stamp, and calculates the timestamp and record number
+    of each record.
+
+    The footer of each frame has the offset in its lower 11 bits, the flags in bits 11 (file mark),
+    12 (remove mark), 13 (empty frame) and 14 (minor frame), and the validation stamp in its
+    upper 16 bits. Minor frames hold one or more sub-frames (each with its own header and footer)
+    packed at the end of the frame, and the offset of each sub-frame footer is the size of the
+    sub-frame in bytes, so they are read backwards from the end of the frame.
+    """
+    import numpy as np
+
+    table = header['lines'][1]
+    interval = _tobInterval(table[1])
+    frame_size = int(table[2])
+    stamp = int(table[4])
+    resolution = _TOB3_RESOLUTIONS[table[5]]
+    nrec = (frame_size - 16) // rec_dtype.itemsize
+
+    #---------
+    # Each frame has a 12-byte header, a number of records and a 4-byte footer
+    frame_dtype = np.dtype([ ('seconds', '<u4'), ('subseconds', '<u4'), ('record', '<u4'),
+                             ('records', rec_dtype, (nrec,)),
+                             ('padding', 'V{}'.format(frame_size - 16 - nrec*rec_dtype.itemsize)),
+                             ('footer', '<u4') ])
+    frames = _mapTOB(fname, header, frame_dtype)
+    #---------
+
+    #---------
+    # Decodes the footer and keeps the valid frames only
+    def decode(footer):
+        validation = footer >> 16
+        valid = (validation == stamp) | (validation == (~stamp & 0xFFFF))
+        removed = (footer >> 12) & 1
+        empty = (footer >> 13) & 1
+        return valid & (removed == 0) & (empty == 0), (footer >> 14) & 1, footer & 0x7FF
+
+    valid, minor, offset = decode(frames['footer'])
+    frames, minor = frames[valid], minor[valid]
+    #---------
+
+    #---------
+    # Full frames: timestamp and record number of each record
+    full = frames[ minor == 0 ]
+    frame_times = full['seconds'].astype(np.int64)*10**9 + \
+                  np.round(full['subseconds']*resolution*1e9).astype(np.int64)
+    position = np.arange(nrec)
+    pieces = [ (np.flatnonzero(minor == 0).repeat(nrec),
+                full['records'].reshape(-1),
+                (frame_times[:, None] + position*interval).reshape(-1),
+                (full['record'].astype(np.int64)[:, None] + position).reshape(-1)) ]
+    #---------
+
+    #---------
+    # Minor frames are read sub-frame by sub-frame, from the end of the frame
+    sub_dtype = np.dtype([ ('seconds', '<u4'), ('subseconds', '<u4'), ('record', '<u4') ])
+    for iframe in np.flatnonzero(minor == 1):
+        raw = frames[ iframe ].tobytes()
+        end = frame_size
+        subframes = []
+        while end >= 16:
+            footer = np.frombuffer(raw, dtype='<u4', count=1, offset=end-4)
+            ok, _, size = decode(footer)
+            size = int(size[0])
+            if (not ok[0] and size == 0) or size < 16 or size > end:
+                break
+            if ok[0]:
+                subframes.append((end - size, (size - 16) // rec_dtype.itemsize))
+            end -= size
+        for start, count in reversed(subframes):
+            head = np.frombuffer(raw, dtype=sub_dtype, count=1, offset=start)[0]
+            time = int(head['seconds'])*10**9 + int(round(int(head['subseconds'])*resolution*1e9))
+            pieces.append((np.full(count, iframe),
+                           np.frombuffer(raw, dtype=rec_dtype, count=count, offset=start+12),
+                           time + np.arange(count)*interval,
+                           int(head['record']) + np.arange(count)))
+    #---------
+
+    #---------
+    # Puts the records back in the order of the frames
+    order = np.argsort(np.concatenate([ piece[0] for piece in pieces ]), kind='stable')
+    records = np.concatenate([ piece[1] for piece in pieces ])[ order ]
+    nanosecs = np.concatenate([ piece[2] for piece in pieces ]).astype(np.int64)[ order ]
+    record_numbers = np.concatenate([ piece[3] for piece in pieces ]).astype(np.int64)[ order ]
+    dates = np.datetime64(_CAMPBELL_EPOCH, 'ns') + nanosecs.astype('timedelta64[ns]')
+    #---------
+
+    return records, dates, record_numbers
+
+
+def readTOB(flist, fileconfig=None, only_named_cols=True, return_units=True):
+    """
+    Reads Campbell Sci's binary TOB1 and TOB3 files
+
+    The records are mapped from the file with a numpy structured dtype (compressed files are
+    decompressed to memory), FP2 values are decoded
+    and the data is indexed by the timestamps of the records, so the result is the same as
+    what timeSeries returns for the equivalent ASCII files.
+
+    Parameters
+    ----------
+    flist: list or string
+        either list or names of files (dataFrame will be one concatenated dataframe) or the name of one file
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files (or the path to a .config file). The keys of its variables
+        must be the positions of the fields in the header of the TOB file (variables with
+        date directives are ignored, since the timestamps come from the records themselves).
+        If None, the names in the header of the file are used and the units are parsed
+        from the header whenever possible.
+    only_named_cols: bool
+        if True (and fileconfig is given), don't return fields that aren't in the variables of fileconfig
+    return_units: bool
+        whether to return the units along with the data
+
+    Returns
+    -------
+    pandas.DataFrame
+        data contained in the files in flist
+    dict (optional)
+        units of the data
+    """
+    import numpy as np
+    import pandas as pd
+    from . import algs
+
+    if isinstance(flist, str):
+        flist = [flist]
+    if isinstance(fileconfig, str):
+        from .core import fileConfig
+        fileconfig = fileConfig(fileconfig)
+
+    datas = []
+    for fname in flist:
+        header = _readTOBHeader(fname)
+        names, header_units, types = header['lines'][-4], header['lines'][-3], header['lines'][-1]
+        rec_dtype = _tobDtype(names, types)
+
+        if header['type'] == 'TOB1':
+            records, dates, record_numbers = _readTOB1(fname, header, rec_dtype)
+        else:
+            records, dates, record_numbers = _readTOB3(fname, header, rec_dtype)
+
+        #---------
+        # Decodes each field. Timestamps fields of TOB1 become the index
+        data = pd.DataFrame(index=pd.DatetimeIndex(dates, name='Timestamp') if dates is not None else None)
+        if record_numbers is not None:
+            data['RECORD'] = record_numbers
+        for name, tp in zip(names, types):
+            if header['type'] == 'TOB1' and name in ['SECONDS', 'NANOSECONDS']:
+                continue
+            if tp.strip() == 'FP2':
+                data[name] = _decodeFP2(records[name])
+            elif tp.strip() in ['SecNano', 'NSec']:
+                secs = records[name+'_seconds'].astype(np.int64)*10**9 + records[name+'_nanoseconds']
+                data[name] = np.datetime64(_CAMPBELL_EPOCH, 'ns') + secs.astype('timedelta64[ns]')
+            elif tp.strip().startswith('ASCII'):
+                data[name] = np.char.decode(np.asarray(records[name]), 'ascii', 'replace')
+            else:
+                data[name] = np.array(records[name])
+        #---------
+
+        #---------
+        # Renames the fields according to the fileConfig
+        if fileconfig is not None:
+            variables = { names[key] : name for key, name in fileconfig.variables.items()
+                            if '%' not in name and key < len(names) }
+            data = data.rename(columns=variables)
+            if only_named_cols:
+                data = data[ [ col for col in data.columns if col in variables.values() ] ]
+        #---------
+        datas.append(data)
+
+    data = pd.concat(datas) if len(datas) > 1 else datas[0]
+
+    if not return_units:
+        return data
+
+    #---------
+    # Units come from the fileConfig or from the header of the (last) file
+    if fileconfig is not None:
+        units = fileconfig.units.copy()
+    else:
+        units = {}
+        for name, unit, tp in zip(names, header_units, types):
+            if (name in data.columns) and (tp.strip() == 'FP2' or tp.strip().startswith('IEEE')):
+                try:
+                    units[name] = algs.parseUnits(_TOB_UNITS.get(unit, unit) or 'dimensionless')
+                except Exception:
+                    print('Could not parse unit "{}" of {}'.format(unit, name))
+    #---------
+    return data, units
+
+
+#---------
+# Cache of parsed configuration files: {path : ((mtime, size, safe), variables)}
+_config_cache = {}
+#---------
+
+
+def _literal_config(source, fname):
+    """
+    Parses the source of a configuration file made only of assignments of python literals
+    (numbers, strings, lists, dicts, etc.) without executing it
+    """
+    import ast
+
+    cvars = {}
+    for node in ast.parse(source, fname).body:
+        #---------
+        # Strings (e.g. docstrings) are ignored
+        if isinstance(node, ast.Expr) and isinstance(getattr(node.value, 'value', None), str):
+            continue
+        #---------
+        if not (isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) for target in node.targets)):
+            raise ValueError('Line {} of {} is not an assignment of a literal'.format(node.lineno, fname))
+        try:
+            value = ast.literal_eval(node.value)
+        except ValueError:
+            raise ValueError('Line {} of {} is not an assignment of a literal'.format(node.lineno, fname))
+        for target in node.targets:
+            cvars[target.id] = value
+    return cvars
+
+
+def _read_config(fname, safe=True):
+    """
+    Reads the variables defined in a configuration file (.config or .site). Results are
+    cached and re-used until the file is modified.
+
+    Parameters
+    ----------
+    fname: str
+        path of the file
+    safe: bool
+        if True the file is parsed without being executed, so it can only have assignments of
+        python literals. If False, the file is executed as python code (the old behavior).
+
+    Returns
+    -------
+    dict
+        variables defined in the file
+    """
+    import os
+    from copy import deepcopy
+
+    path = os.path.abspath(fname)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size, safe)
+    cached = _config_cache.get(path)
+    if (cached is None) or (cached[0] != stamp):
+        with open(path) as fin:
+            source = fin.read()
+        if safe:
+            try:
+                cvars = _literal_config(source, fname)
+            except ValueError as e:
+                raise ValueError('{}. Configuration files with python code must be read with safe=False.'.format(e))
+        else:
+            import types
+            cvars = {}
+            exec(compile(source, fname, 'exec'), {}, cvars)
+            cvars = dict( (key, val) for key, val in cvars.items() if not isinstance(val, types.ModuleType) )
+        _config_cache[path] = cached = (stamp, cvars)
+    return deepcopy(cached[1])
+
+
+def read_fileConfig(dlcfile, safe=True):
     """
     Reads metadata configuration file
 
@@ -185,19 +998,20 @@ def read_fileConfig(dlcfile):
 
     Then the .config should have: variables={0:'%Y-%m-%d %H:%M:%S',1:'u',2:'v'}. This is the default csv format of
     CampbellSci dataloggers. To disable this feature, you should parse the file with read_csv using the kw: quoting=3.
+
+    By default the file is parsed without being executed, so it should only assign python literals
+    (numbers, strings, lists, dicts...). Files are only parsed again if they are modified.
+
+    Parameters
+    ----------
+    dlcfile: str
+        path to the .config file
+    safe: bool
+        if False, the file is executed as python code (needed if it has anything other than literals)
     """
     from .core import fileConfig
 
-    globs={}
-    dlcvars={}
-    try:
-        exec(compile(open(dlcfile).read(), dlcfile, 'exec'), globs, dlcvars)
-    except NameError:
-        print('This version of python does not have an execfile function. This workaround should work but is yet to be fully tested')
-        with open(dlcfile) as f:
-            code=compile(f.read(), dlcfile, 'exec')
-            exec(code, globs, dlcvars)
-    return fileConfig(**dlcvars)
+    return fileConfig(**_read_config(dlcfile, safe=safe))
 
 
 
@@ -228,7 +1042,7 @@ def _read_dlc(dlcfile):
 
 
 
-def read_site(sitefile):
+def read_site(sitefile, safe=True):
     """
     Reads .site configuration file, which holds siteConfig definitions
 
@@ -238,38 +1052,24 @@ def read_site(sitefile):
         displacement_height = 3
         roughness_length    = 1.0
 
-    sitedile: str
-        path to .site file
+    By default the file is parsed without being executed, so it should only assign python literals.
+    Files are only parsed again if they are modified.
 
     Parameters
     ----------
     sitefile: str
         path to the site configuration file
+    safe: bool
+        if False, the file is executed as python code (needed if it has anything other than literals)
 
     Returns
     -------
     pymicra.siteConfig
         pymicra site configuration object
     """
-    from .core import siteConfig, siteConfig
+    from .core import siteConfig
 
-    globs={}
-    sitevars={}
-    try:
-        exec(compile(open(sitefile).read(), sitefile, 'exec'), globs, sitevars)
-    except NameError:
-        print('This version of python does not have an execfile function. This workaround should work but is yet to be fully tested')
-        with open(sitefile) as f:
-            code=compile(f.read(), sitefile, 'exec')
-            exec(code, globs, sitevars)
-
-    #--------
-    # First try new class, if not possible, try old one
-    try:
-        return siteConfig(**sitevars)
-    except:
-        return siteConfig(**sitevars)
-    #--------
+    return siteConfig(**_read_config(sitefile, safe=safe))
 
 
 def readUnitsCsv(filename, **kwargs):
@@ -308,12 +1108,163 @@ def readUnitsCsv(filename, **kwargs):
     return df, unitsdic
 
 
+def read_units(filename, columns=None, parse_units=True):
+    """
+    Reads a binary file written by to_units (a DataFrame plus its units)
+
+    Parameters
+    ----------
+    filename: string
+        path of the file to read. ".npz" is appended if it isn't there.
+    columns: list
+        if given, only these columns are read from the file
+    parse_units: bool
+        whether to return the units as pint units or as strings
+
+    Returns
+    --------
+    df: pandas.DataFrame
+        dataframe with the data
+    unitsdic: dictionary
+        dictionary with the variable names as keys and the units as values
+    """
+    import json
+    import numpy as np
+    import pandas as pd
+    from .algs import parseUnits
+
+    filename = _units_filename(filename)
+    with np.load(filename) as npz:
+        meta = json.loads(str(npz['meta']))
+        positions = dict( (col, i) for i, col in enumerate(meta['columns']) )
+        if columns is None:
+            columns = meta['columns']
+        missing = [ col for col in columns if col not in positions ]
+        if missing:
+            raise KeyError('{} not in {}'.format(missing, filename))
+
+        def get(name, dtype):
+            mask = npz['m'+name] if 'm'+name in npz.files else None
+            return _from_units_array(npz[name], mask, dtype)
+
+        index = get('index', meta['index_dtype'])
+        index.name = meta['index_name']
+        df = pd.DataFrame({ col : pd.Series(get('c{}'.format(positions[col]), meta['dtypes'][positions[col]]), index=index)
+                            for col in columns }, index=index, columns=columns)
+
+    #------
+    # Each different unit is parsed only once
+    unitsdic = dict( (col, meta['units'][positions[col]]) for col in columns
+                     if meta['units'][positions[col]] is not None )
+    if parse_units:
+        parsed = dict( (unit, parseUnits(unit)) for unit in set(unitsdic.values()) )
+        unitsdic = { col : parsed[unit] for col, unit in unitsdic.items() }
+    #------
+    return df, unitsdic
+
+
+def _units_filename(filename):
+    """
+    Name of the file written by np.savez, which appends ".npz" to it if it isn't there
+    """
+    filename = str(filename)
+    return filename if filename.endswith('.npz') else filename + '.npz'
+
+
+def _json_name(name):
+    """
+    Column or index name as something json keeps (and gives back) as is
+    """
+    if hasattr(name, 'item') and not isinstance(name, str):
+        name = name.item()
+    if name is None or isinstance(name, (str, int, float, bool)):
+        return name
+    return str(name)
+
+
+def _to_units_array(values):
+    """
+    Turns an Index or Series into an array np.savez stores without pickling. Returns the array
+    and, for strings and other objects, the mask of missing values (None otherwise).
+    Timezone-aware dates are stored in UTC.
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Index(values)
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.tz_convert('UTC').tz_localize(None).to_numpy(), None
+    array = values.to_numpy()
+    if array.dtype.kind in 'OUS':
+        mask = np.asarray(pd.isna(array))
+        return np.where(mask, '', array).astype(str), mask
+    return array, None
+
+
+def _from_units_array(array, mask, dtype):
+    """
+    Inverse of _to_units_array. Gives back a pandas.Index of the original dtype.
+    """
+    import numpy as np
+    import pandas as pd
+
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return pd.DatetimeIndex(array).tz_localize('UTC').tz_convert(dtype.tz)
+    if mask is not None:
+        values = array.astype(object)
+        values[ mask ] = np.nan
+        if dtype == object:
+            return pd.Index(values, dtype=object)
+        return pd.Index(values).astype(dtype)
+    return pd.Index(array)
+
+
 #-------------------------------------------
 #-------------------------------------------
 # OUTPUT OF DATA
 #-------------------------------------------
 #-------------------------------------------
 
+def to_units(data, units, filename, compress=False):
+    """
+    Writes a DataFrame plus its units to a binary (numpy .npz) file, which is read back with
+    read_units. Each column is kept as an array, so the file is written and read at the speed
+    of the data itself and columns can be read separately. Units are kept as strings and the
+    dtypes of the columns and of the index (including timezones and missing strings) are kept
+    so that read_units gives the same DataFrame back.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        dataframe to write
+    units: dict
+        dictionary with the names of each column and their unit
+    filename: str
+        path to which write the file. ".npz" is appended if it isn't there.
+    compress: bool
+        whether to compress the file
+    """
+    import json
+    import numpy as np
+
+    meta = dict(columns=[ _json_name(col) for col in data.columns ],
+                units=[ str(units[col]) if col in units else None for col in data.columns ],
+                dtypes=[ str(dtype) for dtype in data.dtypes ],
+                index_name=_json_name(data.index.name),
+                index_dtype=str(data.index.dtype))
+
+    arrays = {}
+    for name, values in [ ('c{}'.format(i), data.iloc[:, i]) for i in range(data.shape[1]) ] + [ ('index', data.index) ]:
+        arrays[ name ], mask = _to_units_array(values)
+        if mask is not None and mask.any():
+            arrays[ 'm'+name ] = mask
+    arrays['meta'] = np.array(json.dumps(meta))
+
+    (np.savez_compressed if compress else np.savez)(_units_filename(filename), **arrays)
+    return
+
+
 def _get_printable(data, units, to_tex_cols=True, to_tex_units=True):
     """
     Returns a csv that is pandas-printable. It does so changing the column names to add units to it.
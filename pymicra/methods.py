@@ -34,6 +34,15 @@ def _to_unitsCsv(self, units, filename, **kwargs):
     data.to_csv(filename, **kwargs)
     return
 _pd.DataFrame.to_unitsCsv = _to_unitsCsv
+
+def _to_units(self, units, filename, compress=False):
+    """
+    Wrapper around pymicra.to_units to create a method to write the contents of
+    a dataframe plus its units into a binary file (read it back with pymicra.read_units).
+    """
+    from .io import to_units
+    return to_units(self, units, filename, compress=compress)
+_pd.DataFrame.to_units = _to_units
 #---------------
 
 from .io import _get_printable
@@ -96,13 +105,13 @@ def binwrapper(self, clean_index=True, **kwargs):
         series=False
     #----------
 
+    #----------
+    # All columns are binned at once
     x=np.array(self.index)#.astype(np.float64)
-    out=pd.DataFrame(columns = self.columns)
-    for c in self.columns:
-        xsm, ysm = algs.classbin(x, self[c].astype(np.float64), **kwargs)
-        out[c] = ysm
-    out.index=xsm
+    xsm, ysm = algs.classbin(x, self.to_numpy(dtype=np.float64), **kwargs)
+    out = pd.DataFrame(ysm, index=xsm, columns=self.columns)
     out.index.name = self.index.name
+    #----------
 
     #----------
     # Remove rows where the index is NaN
@@ -107,7 +107,7 @@ def turbulentScales(data, siteConf, units, notation=None, theta_v_mean=None, the
 
     defs = algs.get_notation(notation)
     defsdic = defs.__dict__
-    data = data.copy()
+    data = algs.astype_floats(data, 'float64')
     outunits = {}
     cunits = constants.units
 
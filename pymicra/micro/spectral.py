@@ -44,22 +44,155 @@ def quadrature(data, notation=None):
 
 
 
-@_decor.pdgeneral(convert_out=True)
-def _correctLag(data, notation=None, lag_bounds=[0, 100]):
+def _lag_covariances(ref, values, lags):
+    """
+    Cross-covariances between a reference signal and many signals for a range of lags,
+    calculated with one (zero-padded) FFT. Leading dimensions are treated as different runs.
+
+    Parameters
+    ----------
+    ref: numpy.array
+        reference signal(s), with shape (..., points)
+    values: numpy.array
+        signals with shape (..., points, columns)
+    lags: numpy.array
+        lags (in points) for which to calculate the covariance. Positive lags mean the
+        signals are delayed in relation to the reference.
+
+    Returns
+    -------
+    numpy.array
+        covariances with shape (..., lags, columns)
     """
-    Identifies and correct lags between data, assuming the 
-    vertical wind velocity has lag 0.
+    import numpy as np
+
+    #---------
+    # Fluctuations with missing values set to zero
+    ref = ref - np.nanmean(ref, axis=-1, keepdims=True)
+    values = values - np.nanmean(values, axis=-2, keepdims=True)
+    ref = np.where(np.isfinite(ref), ref, 0.)
+    values = np.where(np.isfinite(values), values, 0.)
+    #---------
+
+    #---------
+    # Zero-padding avoids circular wrap-around of the lags
+    N = ref.shape[-1]
+    nfft = 2**int(np.ceil(np.log2(N + np.max(np.abs(lags)) + 1)))
+    fref = np.fft.rfft(ref, n=nfft, axis=-1)
+    fvals = np.fft.rfft(values, n=nfft, axis=-2)
+    xcov = np.fft.irfft(np.conj(fref)[..., np.newaxis] * fvals, n=nfft, axis=-2)
+    #---------
+
+    return np.take(xcov, np.asarray(lags) % nfft, axis=-2)/N
+
+
+def findLags(data, notation=None, lag_bounds=[0, 100], reference=None, variables=None):
+    """
+    Finds the time lag of each variable in relation to the vertical wind velocity (assumed to have
+    lag zero) as the lag that maximizes the absolute value of their cross-covariance. This is
+    typically used for closed-path gas analyzers, whose signals are delayed by the tube.
+
+    All cross-covariances are calculated in one FFT pass. If data is a list of runs with the same
+    length they are all processed together.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or list
+        dataset or list of datasets (runs)
+    notation: pymicra.Notation
+        notation used in data
+    lag_bounds: list
+        smallest and largest lags (in number of points) to consider
+    reference: str
+        name of the reference column. Default is the vertical wind velocity (or its fluctuations)
+    variables: list
+        columns whose lags are to be found. Default is every column but the reference
+
+    Returns
+    -------
+    pandas.Series or pandas.DataFrame
+        lag (in points) of each variable or, if data is a list, a DataFrame with one line per run
     """
     from .. import algs
-    from .. import data
-    data = data.copy()
+    import numpy as np
+    import pandas as pd
+
     defs = algs.get_notation(notation)
+    runs = [ data ] if isinstance(data, pd.DataFrame) else list(data)
+    columns = runs[0].columns
+    if reference is None:
+        reference = defs.w if defs.w in columns else defs.w_fluctuations
+    if variables is None:
+        variables = [ col for col in columns if col != reference ]
+    lags = np.arange(lag_bounds[0], lag_bounds[1]+1)
+
+    #---------
+    # Runs of the same length are stacked and processed together
+    if len(set(len(run) for run in runs)) == 1:
+        ref = np.stack([ run[ reference ].to_numpy(dtype=np.float64) for run in runs ])
+        values = np.stack([ run[ variables ].to_numpy(dtype=np.float64) for run in runs ])
+        xcovs = _lag_covariances(ref, values, lags)
+    else:
+        xcovs = [ _lag_covariances(run[ reference ].to_numpy(dtype=np.float64), run[ variables ].to_numpy(dtype=np.float64), lags)
+                    for run in runs ]
+    #---------
+
+    found = np.array([ lags[ np.argmax(np.abs(xcov), axis=0) ] for xcov in xcovs ])
+    if isinstance(data, pd.DataFrame):
+        return pd.Series(found[0], index=variables, name='lag')
+    return pd.DataFrame(found, columns=variables, index=[ run.index[0] if len(run) else None for run in runs ])
 
-    variables = data.columns.drop(defs.w)
-    for variable in variables:
-        (Co, Qu) = data.crossSpectrum(data[[defs.w, variable]], frequency=10, anti_aliasing=True)
 
-    return data
+def correctLags(data, notation=None, lag_bounds=[0, 100], lags=None, reference=None, variables=None, return_lags=False):
+    """
+    Identifies and corrects lags between data, assuming the vertical wind velocity has lag 0.
+    Each variable is shifted back in time by its lag (see findLags), so the last points of
+    lagged columns become NaN.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or list
+        dataset or list of datasets (runs)
+    notation: pymicra.Notation
+        notation used in data
+    lag_bounds: list
+        smallest and largest lags (in number of points) to consider
+    lags: pandas.Series or pandas.DataFrame
+        lags to apply (as returned by findLags). If None, they are found with findLags
+    reference: str
+        name of the reference column. Default is the vertical wind velocity (or its fluctuations)
+    variables: list
+        columns to be corrected. Default is every column but the reference
+    return_lags: bool
+        whether to also return the lags applied (useful for quality control)
+
+    Returns
+    -------
+    pandas.DataFrame or list
+        corrected dataset (or list of datasets)
+    pandas.Series or pandas.DataFrame
+        lags applied, if return_lags is True
+    """
+    import pandas as pd
+
+    if lags is None:
+        lags = findLags(data, notation=notation, lag_bounds=lag_bounds, reference=reference, variables=variables)
+
+    if isinstance(data, pd.DataFrame):
+        out = data.copy()
+        for col, lag in lags.items():
+            out[ col ] = out[ col ].shift(-lag)
+    else:
+        out = []
+        for run, (idx, runlags) in zip(data, lags.iterrows()):
+            run = run.copy()
+            for col, lag in runlags.items():
+                run[ col ] = run[ col ].shift(-lag)
+            out.append(run)
+
+    if return_lags:
+        return out, lags
+    return out
 
 
 def phaseCorrection(cross_spec, T):
@@ -305,7 +305,10 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
     defs = algs.get_notation(notation)
     defsdic = defs.__dict__
 
-    data = data.copy()
+    #---------
+    # Covariances are always calculated in double precision, even if data is stored with less
+    data = algs.astype_floats(data, 'float64')
+    #---------
     if (not inplace_units) and units:
         units = units.copy()
     cunits = constants.units
@@ -405,11 +408,11 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
         # If water vapor mixing ratio is present, use it. Otherwise we try to calculate it
         if defs.h2o_molar_mixing_ratio in data.columns:
             mr_h2o = data[ defs.h2o_molar_mixing_ratio ].mean()
-            mr_h2o = (mr_h2o * units[ defs.h2o_molar_mixing_ratio ]).to('dimensionless').magnitude
+            mr_h2o = _to_magnitude(mr_h2o, units[ defs.h2o_molar_mixing_ratio ], 'dimensionless')
 
         elif defs.dry_air_molar_density in data.columns:
-            mr_h2o = (mrho_h2o_mean*units[ defs.h2o_molar_density ] / 
-                    (data[ defs.dry_air_molar_density ].mean()*units[ defs.dry_air_molar_density ])).to('dimensionless').magnitude
+            mr_h2o = _to_magnitude(mrho_h2o_mean/data[ defs.dry_air_molar_density ].mean(),
+                    units[ defs.h2o_molar_density ]/units[ defs.dry_air_molar_density ], 'dimensionless')
 
         else:
             raise TypeError('Either water molar mixing ratio should be provided, or dry air and water density should be the same')
@@ -423,9 +426,7 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
         aux2 = mrho_h2o_mean * (cov[theta_fluc][w_fluc]/theta_mean)
         unt2 = units[ defs.h2o_molar_density ] * units[ w_fluc ]
 
-        aux3 = aux1*unt1 + aux2*unt2
-        unt3 = (aux3/aux3.magnitude).u
-        aux3 = aux3.magnitude
+        aux3, unt3 = _add_magnitudes([aux1, aux2], [unt1, unt2])
 
         out.loc[ defs.water_vapor_flux ] = (1. + mr_h2o)* aux3
         fluxunits[ defs.water_vapor_flux ] = unt3
@@ -445,7 +446,7 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
         print("Re-calculating cov(%s, w') according to WPL correction ... " % mrho_h2o_fluc, end='')
         wplcov = cov.copy()
         w_h2o_units = units[ w_fluc ] * units[ mrho_h2o_fluc ]
-        wplcov.loc[ mrho_h2o_fluc, w_fluc ] = (out[ defs.water_vapor_flux ] * fluxunits[ defs.water_vapor_flux ]).to(w_h2o_units).magnitude
+        wplcov.loc[ mrho_h2o_fluc, w_fluc ] = _to_magnitude(out[ defs.water_vapor_flux ], fluxunits[ defs.water_vapor_flux ], w_h2o_units)
         wplcov.loc[ w_fluc, mrho_h2o_fluc ] = wplcov.loc[ mrho_h2o_fluc, w_fluc ]
         print('done!')
         #---------
@@ -481,9 +482,7 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
             aux3 = mr_sol* E_orig
             unt3 = mr_sol_unit * E_orig_unit
  
-            aux4 = aux1*unt1 + aux2*unt2 + aux3*unt3
-            unt4 = (aux4/aux4.magnitude).u
-            aux4 = aux4.magnitude
+            aux4, unt4 = _add_magnitudes([aux1, aux2, aux3], [unt1, unt2, unt3])
 
             out[ sol_flux ] = aux4
             fluxunits[ sol_flux ] = unt4
@@ -491,7 +490,7 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
 
             print("Re-calculating cov(%s, w') according to WPL correction ... " % solutef, end='')
             w_sol_units = units[ w_fluc ] * units[ solutef ]
-            wplcov.loc[ solutef, w_fluc ] = (out.loc[ sol_flux ] * fluxunits[ sol_flux ]).to(w_sol_units).magnitude
+            wplcov.loc[ solutef, w_fluc ] = _to_magnitude(out.loc[ sol_flux ], fluxunits[ sol_flux ], w_sol_units)
             wplcov.loc[ w_fluc, solutef ] = wplcov.loc[ solutef, w_fluc ]
             print('done!')
             #---------
@@ -549,6 +548,146 @@ def eddyCovariance(data, units, wpl=True, get_turbulent_scales=True, site_config
         return out, fluxunits
 
 
+def _to_magnitude(value, unit, outunit):
+    """
+    Converts a number from one unit to another with the cached conversion factors
+    """
+    from .. import algs
+
+    scale, offset, outunit = algs.conversion_factors(unit, outunit)
+    return value*scale + offset
+
+
+def _add_magnitudes(values, units):
+    """
+    Adds numbers with different units using the cached factors of algs.operate. Returns the
+    sum and its unit
+    """
+    from ..algs.units import _operation_units
+
+    funit, (scales, offset) = _operation_units(units, '+')
+    return sum( value*scale for value, scale in zip(values, scales) ) + offset, funit
+
+
+class unitPlan(object):
+    """
+    Eddy covariance pipeline (coordinate rotation, preProcess, detrend and eddyCovariance) whose
+    units and conversion factors are worked out once and reused by every run.
+
+    Runs read with the same fileConfig always have the same units, so the units of the
+    pre-processed data and of the results only depend on the input units, the columns present
+    and the options of the pipeline. The first run with each set of columns resolves them with
+    pint and the plan keeps them (plan.data_units and plan.units). The input units are kept as
+    frozen units (see pymicra.algs.frozen_units), so every unit operation of the pipeline and
+    every conversion factor (see pymicra.algs.conversion_factors) is computed only once and the
+    following runs take them from caches, only doing the numerical work.
+
+    Parameters
+    ----------
+    units: dict
+        units of the input data (e.g. fileConfig.units)
+    site_config: pymicra.siteConfig
+        site configuration passed to eddyCovariance
+    notation: pymicra.Notation
+        notation used in the data
+    solutes: list
+        solutes to be considered
+    rotate: str
+        how to rotate the coordinates (passed to rotateCoor). If None the data isn't rotated
+    preprocess: dict
+        keywords passed to preProcess
+    detrend: dict
+        keywords passed to detrend
+    fluxes: dict
+        keywords passed to eddyCovariance
+
+    Examples
+    --------
+    >>> plan = pm.unitPlan(fconfig.units, site_config=siteconf, solutes=['co2'],
+    ...         preprocess=dict(expand_temperature=True, use_means=False),
+    ...         detrend=dict(how='linear', ignore=['theta', 'p']))
+    >>> results = pd.concat([ plan.run(data) for data in pm.iterRuns(files, fconfig, rule='30min') ])
+    >>> results.with_units(plan.units)
+    """
+
+    def __init__(self, units, site_config=None, notation=None, solutes=[], rotate='2d',
+            preprocess={}, detrend={'how':'linear'}, fluxes={}):
+        from .. import algs
+
+        self.input_units = algs.frozen_units(units)
+        self.site_config = site_config
+        self.notation = algs.get_notation(notation)
+        self.solutes = list(solutes)
+        self.rotate = rotate
+        self.preprocess = dict(preprocess)
+        self.detrend = dict(detrend)
+        self.fluxes = dict(dict(get_turbulent_scales=True, wpl=True), **fluxes)
+        self._compiled = {}
+        self.data_units = None
+        self.units = None
+
+
+    def __str__(self):
+        return '<pymicra.unitPlan> compiled for {} set(s) of columns'.format(len(self._compiled))
+
+
+    def compile(self, data):
+        """
+        Resolves the units of the pipeline for the columns of data. This is done automatically
+        by the first run() with these columns, but can be called beforehand with a sample run.
+
+        Returns
+        -------
+        data_units: dict
+            units of the pre-processed data and its fluctuations
+        units: dict
+            units of the results
+        """
+        key = tuple(data.columns)
+        if key not in self._compiled:
+            self.run(data)
+        self.data_units, self.units = self._compiled[ key ]
+        return self.data_units, self.units
+
+
+    def run(self, data):
+        """
+        Applies the pipeline to one run of data
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            run of high frequency data with the units given to the plan
+
+        Returns
+        -------
+        pandas.DataFrame
+            one-line DataFrame with the results, whose units are in plan.units
+        """
+        key = tuple(data.columns)
+        units = self.input_units.copy()
+        out = self._pipeline(data, units)
+        if key not in self._compiled:
+            self._compiled[ key ] = (units, dict( (col, units[col]) for col in out.columns ))
+        self.data_units, self.units = self._compiled[ key ]
+        return out
+
+
+    def _pipeline(self, data, units):
+        """
+        Calls each step of the pipeline, updating units in place
+        """
+        if self.rotate:
+            data = rotateCoor(data, notation=self.notation, how=self.rotate)
+        data = preProcess(data, units, notation=self.notation, solutes=self.solutes,
+                            inplace_units=True, **self.preprocess)
+        ddata = data.detrend(units=units, notation=self.notation, **self.detrend)
+        data = data.join(ddata)
+        return eddyCovariance(data, units, site_config=self.site_config, notation=self.notation,
+                                solutes=self.solutes, inplace_units=True, output_as_df=True, **self.fluxes)
+
+
+
 def rotateCoor(data, notation=None, how='2d'):
     """
     """
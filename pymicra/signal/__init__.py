@@ -1,5 +1,12 @@
 from .pysignal import *
-try:
-    from .csignal import *
-except ImportError:
-    print('Numba not found')
+
+#---------
+# Importing numba is slow, so the numba-compiled functions are only imported when first used
+_csignal_names = ('bulk_corr', 'reverse_arrangements', 'cvariogram')
+
+def __getattr__(name):
+    if name in _csignal_names:
+        from . import csignal
+        return getattr(csignal, name)
+    raise AttributeError("module 'pymicra.signal' has no attribute '{}'".format(name))
+#---------
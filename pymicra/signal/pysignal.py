@@ -4,6 +4,7 @@ Defines functions useful to generic signal data
 
 
 from .. import decorators as _decors
+from functools import lru_cache as _lru_cache
 
 
 def mean(data, units, notation=None, inplace_units=True):
@@ -112,6 +113,80 @@ def rotate2D(data, notation=None):
     return data
 
 
+def _window_points(data, window):
+    """
+    Number of points in a window given as a pandas offset string, from the sampling
+    interval of the (datetime) index
+    """
+    import pandas as pd
+
+    if not isinstance(data.index, pd.DatetimeIndex):
+        raise TypeError('Windows given as offset strings need a DatetimeIndex.')
+    if len(data) < 2:
+        return 1
+    step = (data.index[-1] - data.index[0])/(len(data) - 1)
+    return max(int(round(pd.to_timedelta(window)/step)), 1)
+
+
+def _rolling_mean(data, window, center=True, min_periods=None):
+    """
+    Moving mean of all columns at once in O(n) using cumulative sums. Results (including the
+    handling of NaNs, infinite values and of the edges) are the same as data.rolling(window,
+    center=center, min_periods=min_periods).mean()
+    """
+    from .. import algs
+    import numpy as np
+    import pandas as pd
+
+    if min_periods is None:
+        min_periods = window
+    min_periods = max(min_periods, 1)
+
+    values = data.to_numpy(dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    values = np.ascontiguousarray(values.T)
+    n = values.shape[1]
+
+    #-------
+    # Window of point i is [i-window+1, i] or, if centered, shifted forward by (window-1)//2.
+    # Windows are clipped at the edges, which is done by padding the cumulative sums with
+    # their first and last values
+    shift = (window-1)//2 if center else 0
+    def window_sums(x):
+        csum = np.empty(x.shape[:-1] + (n+1+2*window,), dtype=x.dtype)
+        csum[..., :window+1] = 0
+        np.cumsum(x, axis=-1, out=csum[..., window+1:n+window+1])
+        csum[..., n+window+1:] = csum[..., n+window:n+window+1]
+        return csum[..., window+shift+1:window+shift+1+n] - csum[..., shift+1:shift+1+n]
+    #-------
+
+    #-------
+    # Sums of the values (minus their mean, to keep the precision) and of the number of valid
+    # points. Like pandas, which turns them into NaNs before rolling, infinite values aren't valid
+    valid = np.isfinite(values)
+    if valid.all():
+        offset = values.mean(axis=1, keepdims=True)
+        sums = window_sums(values - offset)
+        counts = window_sums(np.ones((1, n), dtype=np.int64))
+    else:
+        nvalid = valid.sum(axis=1, keepdims=True)
+        offset = np.where(valid, values, 0.).sum(axis=1, keepdims=True)/np.maximum(nvalid, 1)
+        sums = window_sums(np.where(valid, values - offset, 0.))
+        counts = window_sums(valid.astype(np.int64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums/counts
+    means += offset
+    means[ np.broadcast_to(counts < min_periods, means.shape) ] = np.nan
+    means = means.T
+    #-------
+
+    means = means.astype(algs.float_dtype(data), copy=False)
+    if isinstance(data, pd.Series):
+        return pd.Series(means[:, 0], index=data.index, name=data.name)
+    return pd.DataFrame(means, index=data.index, columns=data.columns)
+
+
 @_decors.pdgeneral(convert_out=True)
 def trend(data, how='linear', rule=None, window=1200, block_func='mean', center=True, **kwargs):
     """
@@ -126,10 +201,12 @@ def trend(data, how='linear', rule=None, window=1200, block_func='mean', center=
     rule: string
         pandas offset string to define the block in the block average. Default is "10min".
     window: pandas date offset string or int
-        if moving mean/median is chosen, this tells us the window size to pass to pandas. If int,
-        this is the number of points used in the window. If string we will to guess the number of
-        points from the index.
+        if moving mean/median is chosen, this tells us the window size. If int,
+        this is the number of points used in the window. If string the number of points
+        is calculated from the sampling interval of the index.
         Small windows (equivalent to 1min approx) work better when using rollingmedian.
+        Moving means are calculated with cumulative sums (O(n) regardless of the window) and
+        moving medians by pandas. NaNs are treated as in pandas (see min_periods).
     block_func: str, function
         how to resample in block type. Default is mean but it can be any numpy function
         that returns a float. E.g, median.
@@ -149,8 +226,8 @@ def trend(data, how='linear', rule=None, window=1200, block_func='mean', center=
 
     if ('moving' in how) or ('rolling' in how):
         if isinstance(window, str):
-            window = int(len(data)/len(data.resample(window)))
-        elif isinstance(window, int):
+            window = _window_points(data, window)
+        elif isinstance(window, (int, np.integer)):
             pass
         else:
             raise TypeError('Window of moving function should be either an int or a pandas datetime offset string.')
@@ -158,13 +235,15 @@ def trend(data, how='linear', rule=None, window=1200, block_func='mean', center=
         #-------
         # Performs moving average on the data with window
         if ('mean' in how) or ('average' in how):
-            return pd.rolling_mean(data, window=window, center=center, **kwargs)
+            if set(kwargs) - set(['min_periods']):
+                return data.rolling(window, center=center, **kwargs).mean()
+            return _rolling_mean(data, window, center=center, **kwargs)
         #-------
 
         #-------
-        # Performs moving median on the data with window
+        # Performs moving median on the data with window (pandas uses a skip list, so it's O(n log(window)))
         elif 'median' in how:
-            return pd.rolling_median(data, window=window, center=center, **kwargs)
+            return data.rolling(window, center=center, **kwargs).median()
         #-------
 
         #-------
@@ -266,6 +345,11 @@ def detrend(data, how='linear', rule=None, notation=None, suffix=None, units=Non
         #-----------
     #-----------
 
+    #-----------
+    # Fluctuations keep the precision of the input (e.g. float32)
+    df = algs.astype_floats(df, algs.float_dtype(data))
+    #-----------
+
     #-----------
     # We rename the columns names to indicate that they are fluctuations
     if units:
@@ -292,10 +376,78 @@ def detrend(data, how='linear', rule=None, notation=None, suffix=None, units=Non
         return df, units
 
 
-def crossSpectra(data, frequency=10, notation=None, anti_aliasing=True):
+@_lru_cache(maxsize=32)
+def _spectral_grid(N, frequency, anti_aliasing=True):
+    """
+    Gets the frequencies of the real FFT of N points and the weights by which the products of
+    the FFTs are multiplied to become spectra (normalization and anti-aliasing)
+
+    Since runs usually have the same length and frequency the results are cached (and made
+    read-only). Use spectral_cache_info() to check the hit rate.
+
+    Returns
+    -------
+    freq: numpy.array
+        frequencies of each spectral estimate
+    weights: numpy.array
+        column vector (N//2+1, 1) of weights to multiply the spectra
+    """
+    import numpy as np
+
+    freq = np.fft.rfftfreq(N, d=1./frequency)
+    weights = np.full(len(freq), 2./(frequency*N))
+
+    #---------
+    # Anti-aliasing according to Gobbi, Chamecki & Dias, 2006
+    if anti_aliasing:
+        RA = (1. + np.cos(np.pi*np.arange(len(freq))/N))/2.
+        weights *= RA**2.
+    #---------
+
+    weights = weights[:, np.newaxis]
+    freq.setflags(write=False)
+    weights.setflags(write=False)
+    return freq, weights
+
+
+def spectral_cache_info():
+    """
+    Returns the statistics (hits, misses, maxsize, currsize) of the cache of frequencies and
+    weights used by spectra and crossSpectra
+    """
+    return _spectral_grid.cache_info()
+
+
+def _rfft(data, workers=None):
+    """
+    Real FFT of every column of data at once, keeping its floating point precision
+
+    If workers is given the FFT is done with that many threads by pyFFTW (which keeps the
+    FFTW plans of previous calls) or, if it is not installed, by scipy.fft
+    """
+    from .. import algs
+    import numpy as np
+
+    values = data.to_numpy(dtype=algs.float_dtype(data))
+    if workers is None:
+        return np.fft.rfft(values, axis=0)
+
+    try:
+        import pyfftw.interfaces.scipy_fft as fft
+        import pyfftw.interfaces.cache
+        pyfftw.interfaces.cache.enable()
+    except ImportError:
+        import scipy.fft as fft
+    return fft.rfft(values, axis=0, workers=workers)
+
+
+def crossSpectra(data, frequency=10, notation=None, anti_aliasing=True, workers=None):
     """
     Calculates the spectrum for a set of data
 
+    The FFT of each column is computed only once (in a single call for all columns) and the
+    cross-spectra of every pair of columns are obtained from them by broadcasting.
+
     Parameters
     ----------
     data: pandas.DataFrame or pandas.Series
@@ -306,13 +458,14 @@ def crossSpectra(data, frequency=10, notation=None, anti_aliasing=True):
         whether or not to apply anti-aliasing according to Gobbi, Chamecki & Dias, 2006 (doi:10.1029/2005WR004374)
     notation: notation object
         notation to be used
+    workers: int
+        number of threads used for the FFT (with pyFFTW or scipy.fft). Default uses numpy.fft
 
     Returns
     --------
     spectrum: pandas.DataFrame
         whose column is the spectrum or coespectrum of the input dataframe
     """
-    from .. import notation
     from .. import algs
     import numpy as np
     import pandas as pd
@@ -324,41 +477,31 @@ def crossSpectra(data, frequency=10, notation=None, anti_aliasing=True):
     combs = list(combinations(data.columns, 2))
     names = [ notation.cross_spectrum % (a, b) for a, b in combs ]
 
-    specs = pd.DataFrame(columns = names)
-
     #---------
-    # Calculate spectra here
-    for (a, b) in combs: 
-        spec_name = notation.cross_spectrum % (a, b)
-        spec = np.fft.rfft(data.loc[:,a])
-        specs.loc[:, spec_name ] = np.conj(spec) * np.fft.rfft(data.loc[:,b])
-    #---------
-
-    #---------
-    # Anti-aliasing is done here
-    if anti_aliasing:
-        RA = np.array([ 1. + np.cos(np.pi*k/N) for k in range(N/2+1) ])/2.
-        specs = specs.multiply(RA**2., axis='rows')
+    # Calculate cross-spectra here for all pairs (a, b) at once
+    ffts = _rfft(data, workers=workers)
+    first, second = np.triu_indices(ffts.shape[1], 1)
+    freq, weights = _spectral_grid(N, frequency, anti_aliasing=anti_aliasing)
+    specs = np.conj(ffts[:, first]) * ffts[:, second] * weights
     #---------
 
     #---------
-    # Now we normalize the spectrum and calculate their frequency
-    specs *= 2./(frequency*N)
-    freq = np.fft.rfftfreq(len(data), d=1./frequency)
-    specs.index = freq
-    specs.index.name='Frequency'
+    # Cross-spectra keep the precision of the input (e.g. complex64 for float32 data)
+    specs = pd.DataFrame(specs.astype(np.result_type(algs.float_dtype(data), np.complex64), copy=False),
+                            index=pd.Index(freq, name='Frequency'), columns=names)
     #---------
 
     return specs
 
 
 
-
 @_decors.pdgeneral(convert_out=True)
-def spectra(data, frequency=10, notation=None, anti_aliasing=True):
+def spectra(data, frequency=10, notation=None, anti_aliasing=True, workers=None):
     """
     Calculates the cross-spectra for a set of data
 
+    The FFT of all columns is computed in a single call.
+
     Parameters
     ----------
     data: pandas.DataFrame or pandas.Series
@@ -367,15 +510,15 @@ def spectra(data, frequency=10, notation=None, anti_aliasing=True):
         frequency of measurement of signal to pass to numpy.fft.rfftfreq
     anti_aliasing: bool
         whether or not to apply anti-aliasing according to Gobbi, Chamecki & Dias, 2006 (doi:10.1029/2005WR004374)
+    workers: int
+        number of threads used for the FFT (with pyFFTW or scipy.fft). Default uses numpy.fft
 
     Returns
     -------
     spectra: pandas.DataFrame
         whose column is the spectrum or coespectrum of the input dataframe
     """
-    from .. import notation
     from .. import algs
-    import numpy as np
     import pandas as pd
 
     if len(data.columns) < 2:
@@ -384,38 +527,237 @@ def spectra(data, frequency=10, notation=None, anti_aliasing=True):
     notation = algs.get_notation(notation)
 
     N = len(data)
-
     names = [ notation.spectrum % a for a in data.columns ]
-    specs = pd.DataFrame(columns = names)
 
     #---------
-    # Calculate cross-spectra here
-    for name, col in zip(names, data.columns):
-        spec = np.fft.rfft(data.loc[:, col ])
-        specs.loc[:, name ] = np.conj(spec) * spec
+    # Calculate the spectra here. Since it's the spectra, we can ignore the imaginary part
+    ffts = _rfft(data, workers=workers)
+    freq, weights = _spectral_grid(N, frequency, anti_aliasing=anti_aliasing)
+    specs = (ffts.real**2. + ffts.imag**2.) * weights
     #---------
 
     #---------
-    # Since it's the spectra, we can ignore the imaginary part
-    specs = specs.apply(np.real)
+    # Spectra keep the precision of the input (e.g. float32)
+    specs = pd.DataFrame(specs.astype(algs.float_dtype(data), copy=False),
+                            index=pd.Index(freq, name='Frequency'), columns=names)
     #---------
 
-    #---------
-    # Anti-aliasing is done here
-    if anti_aliasing:
-        RA = np.array([ 1. + np.cos(np.pi*k/N) for k in range(N/2+1) ])/2.
-        specs = specs.multiply(RA**2., axis='rows')
-    #---------
+    return specs
 
-    #---------
-    # Now we normalize the spectrum and calculate their frequency
-    specs *= 2./(frequency*N)
-    freq = np.fft.rfftfreq(len(data), d=1./frequency)
-    specs.index = freq
-    specs.index.name='Frequency'
-    #---------
 
-    return specs
+def _segment_points(segment, frequency):
+    """
+    Number of points in a segment given as a number of points or a pandas offset string
+    """
+    import pandas as pd
+
+    if isinstance(segment, str):
+        return int(round(pd.to_timedelta(segment).total_seconds()*frequency))
+    return int(segment)
+
+
+def _welch_ffts(values, nperseg, overlap=0.5, window='hann', detrend=True):
+    """
+    FFTs of the windowed segments of values (points x columns). Segments with NaNs are
+    dropped.
+
+    Returns
+    -------
+    ffts: numpy.array
+        array of shape (segments, nperseg//2+1, columns)
+    norm: float
+        factor that corrects the spectra for the power removed by the window
+    """
+    import numpy as np
+    from scipy.signal import get_window
+
+    step = max(nperseg - int(round(overlap*nperseg)), 1)
+    win = get_window(window, nperseg)
+    if len(values) < nperseg:
+        return np.empty((0, nperseg//2+1, values.shape[1]), dtype=np.complex128), 1.
+
+    segs = np.lib.stride_tricks.sliding_window_view(values, nperseg, axis=0)[::step]
+    segs = segs[ np.isfinite(segs).all(axis=(1, 2)) ]
+    if detrend:
+        segs = segs - segs.mean(axis=-1, keepdims=True)
+    ffts = np.fft.rfft(segs*win, axis=-1).transpose(0, 2, 1)
+    return ffts, nperseg/np.sum(win**2.)
+
+
+def welchSpectra(data, frequency=10, segment='5min', overlap=0.5, window='hann', cross=False,
+        detrend=True, notation=None, anti_aliasing=True):
+    """
+    Calculates the spectra (or cross-spectra) of a set of data averaging the periodograms of
+    overlapping windowed segments (Welch's method). This is less noisy than spectra() and
+    crossSpectra() at the cost of the lowest frequencies.
+
+    The normalization is the one-sided convention of spectra() and crossSpectra(), in which
+    every frequency is doubled. Without anti-aliasing the results are the same as those of
+    scipy.signal.welch and scipy.signal.csd except at the zero frequency and, when segments
+    have an even number of points, at the Nyquist frequency. scipy doesn't double these two,
+    so they are twice scipy's values here.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        dataframe with the signals
+    frequency: float
+        frequency of measurement of signal
+    segment: int or str
+        length of each segment as a number of points or a pandas offset string (e.g. '5min')
+    overlap: float
+        fraction of each segment that overlaps with the next one
+    window: str or tuple
+        window applied to each segment (anything accepted by scipy.signal.get_window)
+    cross: bool
+        if True, returns the cross-spectra of every pair of columns, like crossSpectra().
+        Otherwise returns the spectra, like spectra()
+    detrend: bool
+        whether to remove the mean of each segment
+    notation: pymicra.Notation
+        notation to be used
+    anti_aliasing: bool
+        whether or not to apply anti-aliasing according to Gobbi, Chamecki & Dias, 2006 (doi:10.1029/2005WR004374)
+
+    Returns
+    -------
+    pandas.DataFrame
+        spectra or cross-spectra indexed by frequency
+    """
+    acc = spectraAccumulator(frequency=frequency, segment=segment, overlap=overlap, window=window,
+                                detrend=detrend, notation=notation, anti_aliasing=anti_aliasing)
+    acc.add(data)
+    if cross:
+        return acc.crossSpectra()
+    return acc.spectra()
+
+
+class spectraAccumulator(object):
+    """
+    Accumulates Welch spectra and cross-spectra over many runs (or chunks of data) without
+    keeping the data, so that ensemble-averaged spectra can be obtained for long periods
+    (e.g. a spectral climatology of a site over months).
+
+    Each call to add() splits the data in overlapping windowed segments and adds their
+    periodograms to running sums. Segments don't span two calls and segments with NaNs are
+    ignored. The normalization is the same as in welchSpectra() (see the note there on the
+    zero and Nyquist frequencies).
+
+    Parameters
+    ----------
+    frequency: float
+        frequency of measurement of signal
+    segment: int or str
+        length of each segment as a number of points or a pandas offset string (e.g. '5min')
+    overlap: float
+        fraction of each segment that overlaps with the next one
+    window: str or tuple
+        window applied to each segment (anything accepted by scipy.signal.get_window)
+    detrend: bool
+        whether to remove the mean of each segment
+    notation: pymicra.Notation
+        notation to be used
+    anti_aliasing: bool
+        whether or not to apply anti-aliasing according to Gobbi, Chamecki & Dias, 2006 (doi:10.1029/2005WR004374)
+
+    Examples
+    --------
+    >>> acc = pm.spectraAccumulator(frequency=20, segment='5min')
+    >>> for data in pm.iterRuns(files, fconfig, rule='30min'):
+    ...     acc.add(data[["u'", "w'", "theta_v'"]])
+    >>> spectra = acc.spectra()
+    >>> cospectra = acc.crossSpectra().cospectrum()
+    """
+
+    def __init__(self, frequency=10, segment='5min', overlap=0.5, window='hann', detrend=True,
+            notation=None, anti_aliasing=True):
+        self.frequency = frequency
+        self.nperseg = _segment_points(segment, frequency)
+        self.overlap = overlap
+        self.window = window
+        self.detrend = detrend
+        self.notation = notation
+        self.anti_aliasing = anti_aliasing
+        self.columns = None
+        self.segments = 0
+        self._power = None
+        self._cross = None
+
+
+    def __str__(self):
+        return '<pymicra.spectraAccumulator> of {} segments of {} points'.format(self.segments, self.nperseg)
+
+
+    def add(self, data):
+        """
+        Adds the segments of a run (or chunk) of data to the averages
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            data with the same columns as the data previously added
+
+        Returns
+        -------
+        int
+            number of segments used
+        """
+        import numpy as np
+
+        if self.columns is None:
+            self.columns = list(data.columns)
+        elif list(data.columns) != self.columns:
+            raise ValueError('Columns {} are different from the accumulated columns {}'.format(list(data.columns), self.columns))
+
+        ffts, self._norm = _welch_ffts(data.to_numpy(dtype=np.float64), self.nperseg, overlap=self.overlap,
+                                        window=self.window, detrend=self.detrend)
+        first, second = np.triu_indices(len(self.columns), 1)
+        power = (ffts.real**2. + ffts.imag**2.).sum(axis=0)
+        cross = (np.conj(ffts[:, :, first]) * ffts[:, :, second]).sum(axis=0)
+        if self._power is None:
+            self._power, self._cross = power, cross
+        else:
+            self._power += power
+            self._cross += cross
+        self.segments += len(ffts)
+        return len(ffts)
+
+
+    def _average(self, sums):
+        """
+        Averages the sums of periodograms and applies normalization and anti-aliasing
+        """
+        if not self.segments:
+            raise ValueError('No complete segments were added')
+        freq, weights = _spectral_grid(self.nperseg, self.frequency, anti_aliasing=self.anti_aliasing)
+        return freq, sums * (weights * self._norm / self.segments)
+
+
+    def spectra(self):
+        """
+        Returns the averaged spectra, as in spectra()
+        """
+        from .. import algs
+        import pandas as pd
+
+        notation = algs.get_notation(self.notation)
+        freq, specs = self._average(self._power)
+        return pd.DataFrame(specs, index=pd.Index(freq, name='Frequency'),
+                            columns=[ notation.spectrum % a for a in self.columns ])
+
+
+    def crossSpectra(self):
+        """
+        Returns the averaged cross-spectra, as in crossSpectra()
+        """
+        from .. import algs
+        import pandas as pd
+        from itertools import combinations
+
+        notation = algs.get_notation(self.notation)
+        freq, specs = self._average(self._cross)
+        return pd.DataFrame(specs, index=pd.Index(freq, name='Frequency'),
+                            columns=[ notation.cross_spectrum % (a, b) for a, b in combinations(self.columns, 2) ])
 
 
 def bulkCorr(data):
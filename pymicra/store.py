@@ -0,0 +1,564 @@
+"""
+Defines stores in which data and results are kept on disk along with their units
+"""
+
+
+class resultsStore(object):
+    """
+    Store of results (such as the fluxes returned by eddyCovariance) kept in a SQLite database.
+    Each result is a row indexed by its timestamp, and the units of the columns are kept in the
+    database as well. Float, integer and boolean columns are read back with their dtypes (integer
+    and boolean columns with missing values come back as pandas' nullable Int64 and boolean).
+
+    Rows are written to disk as soon as they are appended, so no progress is lost if the
+    processing is interrupted. Many processes can append to the same store at the same time
+    (writes wait for each other for up to timeout seconds), and the store can be sent to worker
+    processes, since each process opens its own connection.
+
+    Parameters
+    ----------
+    database: str
+        path of the SQLite file where the results are kept. Created if it doesn't exist.
+    table: str
+        name of the table in the database. Many tables (e.g. one per site) can be kept in the same database.
+    timeout: float
+        seconds to wait for other writers before raising an error
+
+    Examples
+    --------
+    >>> store = pm.resultsStore('fluxes.db')
+    >>> for data in pm.iterRuns(filelist, fconfig):
+    ...     results = pm.eddyCovariance(data, units, site_config=siteconf)
+    ...     store.append(results, units)
+    >>> fluxes, fluxunits = store.read('2015-01-01', '2015-02-01')
+    """
+
+    def __init__(self, database, table='results', timeout=60.):
+        self.database = database
+        self.table = table
+        self.timeout = timeout
+        self._connection = None
+
+        self.connection.execute('CREATE TABLE IF NOT EXISTS {} (Timestamp INTEGER PRIMARY KEY)'.format(_quote(table)))
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS units (
+                                     "table" TEXT,
+                                     "column" TEXT,
+                                     unit TEXT,
+                                     PRIMARY KEY ("table", "column"))''')
+
+
+    @property
+    def connection(self):
+        """
+        Connection to the database, opened when first needed (once per process)
+        """
+        import sqlite3
+
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database, timeout=self.timeout, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        return self._connection
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM {}'.format(_quote(self.table))).fetchone()[0]
+
+
+    def __str__(self):
+        return '<pymicra.resultsStore> with {} rows at {}:{}'.format(len(self), self.database, self.table)
+
+
+    def close(self):
+        """
+        Closes the connection to the database
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+    @property
+    def columns(self):
+        """
+        Names of the columns in the store
+        """
+        info = self.connection.execute('PRAGMA table_info({})'.format(_quote(self.table))).fetchall()
+        return [ row[1] for row in info if row[1] != 'Timestamp' ]
+
+
+    def append(self, results, units=None):
+        """
+        Writes results to the store. Rows with the same timestamp as rows already in the
+        store replace them, and new columns are added as needed.
+
+        Parameters
+        ----------
+        results: pandas.DataFrame or pandas.Series
+            results indexed by timestamp. A Series is taken as a single row whose timestamp is its name.
+        units: dict
+            units of the columns of results. Units of columns that are already in the store
+            must be the same.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(results, pd.Series):
+            results = results.to_frame().T
+        if len(results) == 0:
+            return
+        index = pd.DatetimeIndex(results.index)
+        cols = [ str(col) for col in results.columns ]
+        units = units or {}
+
+        #---------
+        # Other writers wait until this transaction is over
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            #---------
+            # Adds columns that aren't in the table yet and checks the units
+            current = self.columns
+            for col, dtype in zip(cols, results.dtypes):
+                if col not in current:
+                    sqltype = _sqltypes.get(dtype.kind, 'TEXT')
+                    self.connection.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(_quote(self.table), _quote(col), sqltype))
+            stored = self._units()
+            for col in cols:
+                if col not in units:
+                    continue
+                unit = str(units[col])
+                if col in stored and stored[col] != unit:
+                    raise ValueError('Unit of {} is {} in the store, but {} was given'.format(col, stored[col], unit))
+                self.connection.execute('INSERT OR REPLACE INTO units VALUES (?, ?, ?)', (self.table, col, unit))
+            #---------
+
+            #---------
+            # Writes the rows
+            values = results.astype(object).where(results.notnull(), None).values.tolist()
+            stamps = index.values.astype('datetime64[ns]').astype(np.int64).tolist()
+            rows = [ [ stamp ] + row for stamp, row in zip(stamps, values) ]
+            self.connection.executemany('INSERT OR REPLACE INTO {} ("Timestamp", {}) VALUES ({})'.format(_quote(self.table),
+                    ', '.join(_quote(col) for col in cols), ', '.join(['?']*(len(cols)+1))), rows)
+            #---------
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        #---------
+
+
+    def _units(self):
+        """
+        Returns the units kept in the store as strings
+        """
+        return dict(self.connection.execute('SELECT "column", unit FROM units WHERE "table"=?', (self.table,)))
+
+
+    def read(self, begin_date=None, end_date=None, columns=None, parse_units=True):
+        """
+        Reads the results between two dates (inclusive)
+
+        Parameters
+        ----------
+        begin_date: str or datetime
+            results before this date are left out
+        end_date: str or datetime
+            results after this date are left out
+        columns: list
+            if given, only these columns are read
+        parse_units: bool
+            whether to return the units as pint units or as strings
+
+        Returns
+        -------
+        pandas.DataFrame
+            results indexed by timestamp
+        dict
+            units of the columns
+        """
+        import pandas as pd
+        from . import algs
+
+        info = self.connection.execute('PRAGMA table_info({})'.format(_quote(self.table))).fetchall()
+        sqltypes = { row[1] : row[2] for row in info }
+        cols = self.columns if columns is None else list(columns)
+        conditions, params = [], []
+        if begin_date is not None:
+            conditions.append('Timestamp >= ?')
+            params.append(pd.Timestamp(begin_date).value)
+        if end_date is not None:
+            conditions.append('Timestamp <= ?')
+            params.append(pd.Timestamp(end_date).value)
+        query = 'SELECT "Timestamp", {} FROM {}'.format(', '.join(_quote(col) for col in cols), _quote(self.table))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY Timestamp'
+
+        data = pd.DataFrame.from_records(self.connection.execute(query, params).fetchall(),
+                                         columns=['Timestamp'] + cols)
+        data.index = pd.DatetimeIndex(pd.to_datetime(data.pop('Timestamp'), unit='ns'), name='Timestamp')
+        for col in cols:
+            if sqltypes[col] in _dtypes:
+                data[col] = _restore_dtype(data[col], sqltypes[col])
+
+        units = { col : unit for col, unit in self._units().items() if col in cols }
+        if parse_units:
+            units = algs.parseUnits(units)
+        return data, units
+
+
+
+class rawArchive(object):
+    """
+    Archive of (high-frequency) data such as the output of timeSeries, kept in a directory as
+    time-chunked numpy files (one .npz file per chunk, one array per column). The units and the
+    fileConfig of the data are kept as attributes, along with an index of the time span of
+    each chunk, so that reading a time window only opens the chunks that overlap it (and only
+    the columns asked for).
+
+    Parameters
+    ----------
+    path: str
+        directory of the archive. Created if it doesn't exist, otherwise the archive in it is opened.
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files from which the data came (or the path to a .config file).
+        Only used when a new archive is created.
+    units: dict
+        units of the data. Only used when a new archive is created (or if it has no units yet).
+    chunk: str
+        pandas offset string defining the time span of each chunk. Only used when a new archive is created.
+    compress: bool
+        whether to compress the chunks (smaller, but slower to write and read)
+
+    Examples
+    --------
+    >>> archive = pm.archiveFiles(filelist, fconfig, 'raw_archive', chunk='1h')
+    >>> data, units = archive.read('2015-01-01 12:00', '2015-01-01 12:30')
+    """
+
+    def __init__(self, path, fileconfig=None, units=None, chunk='1h', compress=False):
+        import os
+
+        self.path = path
+        self.compress = compress
+        if os.path.isfile(self._attrs_path):
+            self._load_attrs()
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            if isinstance(fileconfig, str):
+                from . import fileConfig
+                fileconfig = fileConfig(fileconfig)
+            self.attrs = dict(chunk=chunk, columns=[], units={}, fileconfig=_config2dict(fileconfig), chunks={})
+        if units and not self.attrs['units']:
+            self.attrs['units'] = { key : str(unit) for key, unit in units.items() }
+        self._save_attrs()
+
+
+    @property
+    def _attrs_path(self):
+        import os
+        return os.path.join(self.path, 'attrs.json')
+
+
+    def _load_attrs(self):
+        import json
+        with open(self._attrs_path, 'rt') as fin:
+            self.attrs = json.load(fin)
+
+
+    def _save_attrs(self):
+        """
+        Writes the attributes atomically, so the archive is never left inconsistent
+        """
+        import os
+        import json
+        tmp = self._attrs_path + '.tmp'
+        with open(tmp, 'wt') as fou:
+            json.dump(self.attrs, fou, indent=1)
+        os.replace(tmp, self._attrs_path)
+
+
+    def __len__(self):
+        return sum( info['rows'] for info in self.attrs['chunks'].values() )
+
+
+    def __str__(self):
+        return '<pymicra.rawArchive> with {} rows in {} chunks at {}'.format(len(self), len(self.attrs['chunks']), self.path)
+
+
+    @property
+    def units(self):
+        """
+        Units of the data (as pint units)
+        """
+        from . import algs
+        return algs.parseUnits(self.attrs['units'])
+
+
+    @property
+    def fileconfig(self):
+        """
+        fileConfig of the files from which the data came
+        """
+        return _dict2config(self.attrs['fileconfig'])
+
+
+    @property
+    def columns(self):
+        return list(self.attrs['columns'])
+
+
+    @property
+    def chunks(self):
+        """
+        Index of the chunks as a pandas.DataFrame with the file name, first and last timestamp and number of rows
+        """
+        import pandas as pd
+        df = pd.DataFrame.from_dict(self.attrs['chunks'], orient='index', columns=['file', 'first', 'last', 'rows'])
+        df.index = pd.to_datetime(df.index)
+        df['first'] = pd.to_datetime(df['first'], unit='ns')
+        df['last'] = pd.to_datetime(df['last'], unit='ns')
+        return df.sort_index()
+
+
+    def append(self, data, units=None):
+        """
+        Writes data to the archive. Data that falls in chunks that already exist is merged with them
+        (rows with repeated timestamps are replaced by the new ones).
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            data indexed by timestamp (e.g. the output of timeSeries)
+        units: dict
+            units of the data. If the archive has no units yet, these become its units.
+        """
+        import os
+        import numpy as np
+        import pandas as pd
+
+        if not isinstance(data.index, pd.DatetimeIndex):
+            raise TypeError('Data must be indexed by date to be archived. Use parse_dates=True.')
+        if units and not self.attrs['units']:
+            self.attrs['units'] = { key : str(unit) for key, unit in units.items() }
+        for col in data.columns:
+            if col not in self.attrs['columns']:
+                self.attrs['columns'].append(col)
+
+        labels = data.index.floor(self.attrs['chunk'])
+        for label in labels.unique():
+            piece = data[ labels == label ]
+            key = str(label)
+
+            #---------
+            # Merges with data already in the chunk
+            if key in self.attrs['chunks']:
+                old = self._read_chunk(key)
+                piece = pd.concat([ old, piece ])
+                piece = piece[ ~piece.index.duplicated(keep='last') ]
+            piece = piece.sort_index(kind='mergesort')
+            #---------
+
+            #---------
+            # Each column is an array in the .npz file, named by its position in the archive
+            fname = label.strftime('%Y%m%d-%H%M%S') + '.npz'
+            arrays = { 'c{}'.format(self.attrs['columns'].index(col)) : _to_array(piece[col]) for col in piece.columns }
+            arrays['index'] = piece.index.values.astype('datetime64[ns]').astype(np.int64)
+            tmp = os.path.join(self.path, fname + '.tmp.npz')
+            (np.savez_compressed if self.compress else np.savez)(tmp, **arrays)
+            os.replace(tmp, os.path.join(self.path, fname))
+            #---------
+
+            self.attrs['chunks'][key] = dict(file=fname, first=int(arrays['index'][0]),
+                                             last=int(arrays['index'][-1]), rows=len(piece))
+        self._save_attrs()
+
+
+    def _read_chunk(self, key, columns=None, begin=None, end=None):
+        """
+        Reads one chunk (or the part of it between begin and end, in nanoseconds)
+        """
+        import os
+        import numpy as np
+        import pandas as pd
+
+        positions = dict( (col, i) for i, col in enumerate(self.attrs['columns']) )
+        columns = self.attrs['columns'] if columns is None else columns
+        with np.load(os.path.join(self.path, self.attrs['chunks'][key]['file'])) as npz:
+            index = npz['index']
+            start = 0 if begin is None else np.searchsorted(index, begin, side='left')
+            stop = len(index) if end is None else np.searchsorted(index, end, side='right')
+            data = pd.DataFrame(index=pd.DatetimeIndex(index[start:stop].astype('datetime64[ns]'), name='Timestamp'))
+            for col in columns:
+                name = 'c{}'.format(positions[col])
+                data[col] = npz[name][start:stop] if name in npz.files else np.nan
+        return data
+
+
+    def read(self, begin_date=None, end_date=None, columns=None, return_units=True):
+        """
+        Reads the data between two dates (inclusive), opening only the chunks that overlap them
+
+        Parameters
+        ----------
+        begin_date: str or datetime
+            data before this date is left out
+        end_date: str or datetime
+            data after this date is left out
+        columns: list
+            if given, only these columns are read
+        return_units: bool
+            whether to return the units along with the data
+
+        Returns
+        -------
+        pandas.DataFrame
+            data indexed by timestamp
+        dict (optional)
+            units of the data
+        """
+        import pandas as pd
+
+        begin = None if begin_date is None else pd.Timestamp(begin_date).value
+        end = None if end_date is None else pd.Timestamp(end_date).value
+        if columns is not None:
+            missing = [ col for col in columns if col not in self.attrs['columns'] ]
+            if missing:
+                raise KeyError('{} not in the archive'.format(missing))
+
+        keys = sorted( key for key, info in self.attrs['chunks'].items()
+                        if (begin is None or info['last'] >= begin) and (end is None or info['first'] <= end) )
+        pieces = [ self._read_chunk(key, columns=columns, begin=begin, end=end) for key in keys ]
+        if pieces:
+            data = pd.concat(pieces)
+        else:
+            data = pd.DataFrame(columns=self.attrs['columns'] if columns is None else columns,
+                                index=pd.DatetimeIndex([], name='Timestamp'))
+
+        if return_units:
+            units = self.units
+            return data, { key : unit for key, unit in units.items() if key in data.columns }
+        return data
+
+
+def archiveFiles(flist, fileconfig, path, chunk='1h', compress=False, verbose=False, **kwargs):
+    """
+    Converts a list of data files into a rawArchive, one file at a time
+
+    Parameters
+    ----------
+    flist: list or string
+        list of files or the name of one file
+    fileconfig: pymicra.fileConfig or str
+        configuration of the files (or the path to a .config file)
+    path: str
+        directory of the archive. If it already exists, data is added to it.
+    chunk: str
+        pandas offset string defining the time span of each chunk
+    compress: bool
+        whether to compress the chunks
+    verbose: bool
+        whether to print the name of each file as it is archived
+    kwargs: dict
+        keywords to pass to timeSeries (through iterFiles)
+
+    Returns
+    -------
+    pymicra.rawArchive
+        the archive
+    """
+    from .io import iterFiles
+
+    if isinstance(fileconfig, str):
+        from . import fileConfig
+        fileconfig = fileConfig(fileconfig)
+    kwargs['parse_dates']=True
+    archive = rawArchive(path, fileconfig=fileconfig, units=fileconfig.units, chunk=chunk, compress=compress)
+    for fname, data, units in iterFiles(flist, fileconfig, **kwargs):
+        if verbose: print('Archiving', fname)
+        archive.append(data, units)
+    return archive
+
+
+def _to_array(series):
+    """
+    Returns the values of a Series as a numpy array that can be saved without pickling
+    """
+    values = series.to_numpy()
+    if values.dtype.kind == 'O':
+        values = values.astype(str)
+    return values
+
+
+def _config2dict(fileconfig):
+    """
+    Turns a fileConfig into a dict that can be saved as json (units become strings)
+    """
+    if fileconfig is None:
+        return None
+    out = {}
+    for key, value in fileconfig.__dict__.items():
+        if key == 'units':
+            value = { var : str(unit) for var, unit in value.items() }
+        elif key == 'variables':
+            value = [ [ col, var ] for col, var in value.items() ]
+        if isinstance(value, (str, int, float, bool, list, dict, type(None))):
+            out[key] = value
+    return out
+
+
+def _dict2config(config):
+    """
+    Recreates a fileConfig from the output of _config2dict
+    """
+    from . import algs
+    from .core import fileConfig
+
+    if config is None:
+        return None
+    config = dict(config)
+    fconfig = fileConfig.__new__(fileConfig)
+    if 'variables' in config:
+        config['variables'] = dict( (col, var) for col, var in config['variables'] )
+    if 'units' in config:
+        config['units'] = algs.parseUnits(config['units'])
+    fconfig.__dict__.update(config)
+    return fconfig
+
+
+#---------
+# SQLite types in which resultsStore keeps each kind of numpy dtype, and back
+_sqltypes = dict(f='REAL', i='INTEGER', u='INTEGER', b='BOOLEAN')
+_dtypes = dict(REAL=('float64', 'float64'), INTEGER=('int64', 'Int64'), BOOLEAN=('bool', 'boolean'))
+#---------
+
+
+def _quote(name):
+    """
+    Quotes a table or column name so that it can be used in a SQL statement
+    """
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+
+def _restore_dtype(values, sqltype):
+    """
+    Returns the values read from a column of a resultsStore with the dtype with which they were
+    written. Integer and boolean columns with missing values become pandas' nullable dtypes, and
+    integer columns that also hold floats (appended later) become float64.
+    """
+    import pandas as pd
+
+    dtype, nullable = _dtypes[sqltype]
+    values = pd.to_numeric(values)
+    if values.dtype.kind == 'f' and dtype != 'float64':
+        valid = values.dropna()
+        if (valid != valid.round()).any():
+            return values
+        return values.astype(nullable) if values.isnull().any() else values.astype(dtype)
+    return values.astype(dtype)
@@ -379,7 +379,7 @@ def check_spikes(data, chunk_size='2min',
     return fou, valid, fault_count
 
 
-def check_numlines(fname, numlines=18000, falseverbose=False):
+def check_numlines(fname, numlines=18000, falseverbose=False, lines=None):
     """
     Checks length of file against a correct value.
     Returns False is length is wrong and True if length is right
@@ -390,6 +390,9 @@ def check_numlines(fname, numlines=18000, falseverbose=False):
         path of the file to check
     numlines: int
         correct number of lines that the file has to have
+    lines: int
+        length of the file, if already known (e.g. from a pymicra.fileCatalog). If None, the
+        lines of the file are counted.
 
     Returns
     -------
@@ -399,7 +402,8 @@ def check_numlines(fname, numlines=18000, falseverbose=False):
     from . import algs
     import pandas as pd
 
-    lines = algs.file_len(fname)
+    if lines is None:
+        lines = algs.file_len(fname)
     if lines==numlines:
         return pd.Series([True], index=['file'])
     else:
@@ -37,7 +37,9 @@ def qcontrol(files, fileconfig,
              outdir='quality_controlled',
              summary_file='qcontrol_summary.csv',
              replaced_report=None,
-             full_report=None):
+             full_report=None,
+             catalog=None,
+             prefetch=0):
 
     """
     Function that applies various tests quality control to a set of datafiles and re-writes
@@ -173,6 +175,12 @@ def qcontrol(files, fileconfig,
         name of directory in which to write the successful runs. Directory must already exist.
     summary_file: str
         path of file to be created with the summary of the runs. Will be overwriten if already exists.
+    catalog: pymicra.fileCatalog
+        if given, the date check and the lines test are done with the dates and number of lines
+        kept in the catalog (which is updated with files first), instead of opening each file.
+    prefetch: int
+        if larger than zero, this many files are read ahead in a background thread while the
+        current one is tested (files that fail the date check are not read).
 
     Returns
     -------
@@ -272,6 +280,38 @@ def qcontrol(files, fileconfig,
     tables = tables.fillna(value=np.nan)
     #--------------
 
+    #--------------
+    # File dates are taken from the catalog (if there's one) or from the file names
+    if catalog is not None:
+        catalog.update(files)
+    if begin_date or end_date:
+        if catalog is not None:
+            file_dates = catalog.dates(files)
+        else:
+            file_dates = { filepath : algs.name2date(basename(filepath), fileconfig) for filepath in files }
+        in_range = lambda cdate: (cdate is not None) and ((not begin_date) or cdate>=begin_date) and ((not end_date) or cdate<=end_date)
+        dated = [ filepath for filepath in files if in_range(file_dates[filepath]) ]
+    else:
+        dated = list(files)
+    #--------------
+
+    #--------------
+    # Lengths of the files that pass the date check are taken from the catalog or counted all at once
+    if file_lines:
+        if catalog is not None:
+            file_numlines = catalog.lines(dated)
+        else:
+            file_numlines = dict(zip(dated, algs.file_lens(dated)))
+    #--------------
+
+    #--------------
+    # Files that pass the date check can be read ahead in a background thread
+    if prefetch:
+        from .io import _prefetch
+        from functools import partial
+        readahead = _prefetch(partial(timeSeries, datalogger=fileconfig, **read_files_kw), dated, depth=prefetch)
+    #--------------
+
     #-------------------------------------
     # BEGINNING OF MAIN PROGRAM
     #-------------------------------------
@@ -283,7 +323,10 @@ def qcontrol(files, fileconfig,
         #---------------
         # DATE CHECK
         if begin_date or end_date:
-            cdate = algs.name2date(filename, fileconfig)
+            cdate = file_dates[filepath]
+            if cdate is None:
+                print("Skipped because its date couldn't be determined.\n")
+                continue
             if begin_date:
                 if cdate<begin_date:
                     print('Skipped because of begin_date.\n')
@@ -297,12 +340,15 @@ def qcontrol(files, fileconfig,
         #----------------
         # If the test passes the date check then we include it in the total amount
         control.loc[idx, total_name ] = filename
+        if prefetch:
+            future = next(readahead)
         #----------------
     
         #-------------------------------
         # LINE NUMBERS TEST
         if file_lines:
-            valid = tests.check_numlines(filepath, numlines=file_lines, falseverbose=falseverbose)
+            valid = tests.check_numlines(filepath, numlines=file_lines, falseverbose=falseverbose,
+                                         lines=file_numlines[filepath])
 
             result, failed = algs.testValid(valid, testname=lines_name, trueverbose=trueverbose, filepath=filepath, falseverbose=falseverbose)
             if result == False:
@@ -315,7 +361,10 @@ def qcontrol(files, fileconfig,
         # OPENNING OF THE FILE HAPPENS HERE
         # TRY-EXCEPT IS A SAFETY NET BECAUSE OF THE POOR DECODING (2015-06-21 00:00 appears as 2015-06-20 24:00)
         try:
-            fin=timeSeries(filepath, fileconfig, **read_files_kw)
+            if prefetch:
+                fin=future.result()
+            else:
+                fin=timeSeries(filepath, fileconfig, **read_files_kw)
         except ValueError as e:
             if str(e)=='unconverted data remains: 0' and cdate.hour==23:
                 continue
@@ -509,7 +558,7 @@ def _printUnit(string, mode='L', trim=True, greek=True):
 
 def separateFiles(files, dlconfig, outformat='out_%Y-%m-%d_%H:%M.csv', outdir='',
                 verbose=False, firstflag='.first', lastflag='.last', save_ram=False,
-                frequency='30min', quoting=0, use_edges=False):
+                frequency='30min', quoting=0, use_edges=False, block_size=2**24):
     """
     Separates files into (default) 30-minute smaller files. Useful for output files such
     as the ones by Campbell Sci, that can have days of data in one single file.
@@ -531,22 +580,26 @@ def separateFiles(files, dlconfig, outformat='out_%Y-%m-%d_%H:%M.csv', outdir=''
     lastflag: str
         flag to put after the name of the fle for the last file to be created
     save_ram: bool
-        if you have an amount of files that are to big for pandas to load on your ram this should be set to true
+        if you have an amount of files that are to big to load on your ram this should be set to true.
+        Files are then streamed in blocks, so memory use doesn't depend on the size of the files.
+        Either way each line is copied as is to its output file and lines must be in chronological order.
     frequency:
         the frequency in which to separate
     quoting: int
-        for pandas (see read_csv documentation)
+        not used anymore, since lines are copied as they are. Kept for compatibility
     use edges: bool
         use this carefully. This concatenates the last few lines of a file to the first few lines
         of the next file in case they don't finish on a nice round time with respect to the frequency
+    block_size: int
+        approximate size in bytes of the blocks read at a time when save_ram==True
 
     Returns
     -------
     None
     """
+    import os
     from os import path
-    from . import io
-    import pandas as pd
+    import numpy as np
     from . import algs
 
     #-----------------------
@@ -554,117 +607,96 @@ def separateFiles(files, dlconfig, outformat='out_%Y-%m-%d_%H:%M.csv', outdir=''
     outpath=path.join(outdir, outformat)
     firstpath= path.join(outdir, outformat+firstflag)
     lastpath = path.join(outdir, outformat+ lastflag)
-    parser = lambda x: algs.line2date(x, dlconfig)
     badfiles = []
     #-----------------------
 
     #------------
-    # if there's no need to save RAM, then I will use pandas, which is faster
-    if save_ram == False:
-    #------------
-        for f in files:
-            df=io.timeSeries(f, dlconfig, parse_dates=True, 
-                parse_dates_kw={'clean' : False}, 
-                read_data_kw={'quoting' : quoting})
-            chunks, index = algs.splitData(df, frequency, return_index=True)
-            for idx, chunk in zip(index,chunks):
-                out = idx.strftime(outpath)
-                if verbose: print('Writting chunk to ',out)
-                chunk.to_csv(out, index=False, header=False)
-        return
-    
-    #------------
-    # If RAM consumption is an issue, then I won't use pandas. This saves RAM but takes a lot longer.
-    else:
-        header = dlconfig.header_lines
-        if header==None: header=0
+    # Lines are copied as they are to the output files (so that they can be read with the same
+    # fileConfig) and only their dates are parsed. If RAM consumption is an issue the files are
+    # streamed in blocks of lines, otherwise each file is read at once
+    if not save_ram:
+        block_size = 0
+    skiprows = set(dlconfig.skiprows)
     #------------
-        for fin in files:
-            print('Now opening',fin)
+    for fname in files:
+        print('Now opening',fname)
+        with algs.open_file(fname, 'rt') as fin:
+            fou = None
+            current = None
+            nline = 0
+            while True:
+                #------------
+                # Reads a block of lines and drops the header and empty lines
+                block = fin.readlines(block_size)
+                if not block:
+                    break
+                lines = [ line for i, line in enumerate(block, nline) if (i not in skiprows) and line.strip() ]
+                nline += len(block)
+                if not lines:
+                    continue
+                #------------
+
+                #------------
+                # Finds the interval of each line and where the interval changes within the block
+                labels = algs.lines2dates(lines, dlconfig).floor(frequency)
+                changes = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+                bounds = np.concatenate([ [0], changes, [len(lines)] ])
+                #------------
+
+                #------------
+                # Each interval is written once. The first one of each file is labeled separately
+                for begin, end in zip(bounds[:-1], bounds[1:]):
+                    label = labels[begin]
+                    if label != current:
+                        if (current is not None) and (label < current):
+                            raise ValueError('Lines of {} are not in chronological order near {}'.format(fname, label))
+                        if fou:
+                            fou.close()
+                        outname = label.strftime(outpath if fou else firstpath)
+                        if verbose: print('Writting chunk to ', outname)
+                        fou = open(outname, 'wt')
+                        current = label
+                    fou.writelines(lines[begin:end])
+                #------------
+
             #------------
-            # Creates a sequence of equaly-spaced dates based on the frequency and nicely rounded-up
-            ft, lt = algs.first_last(fin)
-            ft, lt = list(map(parser, [ft, lt]))
-            labeldates = pd.Series(index=pd.date_range(start=ft, end=lt, freq='min')).resample(frequency).index
-            nfiles=len(labeldates)
-            if nfiles == 0:
-                badfiles.append(fin)
+            # The last interval is labeled separately, so it can be identified and put together
+            # later. A file with only one interval keeps the first label
+            if fou is None:
+                badfiles.append(fname)
                 continue
+            fou.close()
+            if outname != current.strftime(firstpath):
+                os.replace(outname, current.strftime(lastpath))
             #------------
 
-            with open(fin, 'rt') as fin:
-                for i in range(header):
-                    fou.write(fin.readline())
-                lines=[]
-                pos=fin.tell()
-                for i, line in enumerate(fin):
-                    cdate=parser(line)
-                    if (cdate>=labeldates[0]) and (cdate<labeldates[1]):
-                        lines.append(line)
-                    elif (cdate>=labeldates[1]):
-                        if verbose:
-                            print(labeldates[0])
-                        #------------
-                        # labels first and last runs separately, so they can be identified and put together later
-                        if len(labeldates) == nfiles:
-                            fou = open((labeldates[0]).strftime(firstpath), 'wt')
-                        else:
-                            fou = open((labeldates[0]).strftime(outpath), 'wt')
-                        #------------
-                        fou.writelines(lines)
-                        fou.close()
-                        labeldates=labeldates.drop(labeldates[0])
-                        #---------
-                        # this is in case the data has a big jump of more than the value of the frequency
-                        while True:
-                            if (len(labeldates)>1) and (cdate>=labeldates[1]):
-                                labeldates=labeldates.drop(labeldates[0])
-                            elif (cdate>=labeldates[0]) or (len(labeldates)==1):
-                                break
-                            else:
-                                raise ValueError('SOMETHING WRONG\nCHECK ALGORITHM')
-                        #---------
-
-                        #---------
-                        # Starts over the lines
-                        lines = [line]
-                        #---------
-                #---------
-                # This prints the last lines of the file
-                        if len(labeldates)==1: break
-                for line in fin:
-                    lines.append(line)
-                fou=open((labeldates[0]).strftime(lastpath), 'wt')
-                fou.writelines(lines)
-                fou.close()
-                #---------
+    print('List of bad files:', badfiles)
 
-        #----------------
-        # This feature avoids losing the ends of large files by concatenating the end of a file
-        # with the beginning of the next one (only when either files do not end on a rounded time)
-        if use_edges:
-        #----------------
-            from glob import glob
-            ledges = sorted(glob(path.join(outdir,'*'+lastflag )))
-            fedges = sorted(glob(path.join(outdir,'*'+firstflag)))
-            for last in ledges:
-                root = last[:-len(lastflag)]
-                try:
-                    idx = fedges.index(root+firstflag)
-                except ValueError:
-                    continue
-                last_lines = open(last,'rt').readlines()
-                first = fedges.pop(idx)
-                first_lines = open(first,'rt').readlines()
-                if verbose:
-                    print('Concatenating ', last, ' and ', first)
-                with open(root, 'wt') as fou:
-                    fou.writelines(last_lines)
-                    fou.writelines(first_lines)
-
-        print('List of bad files:', badfiles)
-        if verbose:
-            print('Done!')
+    #----------------
+    # This feature avoids losing the ends of large files by concatenating the end of a file
+    # with the beginning of the next one (only when either files do not end on a rounded time)
+    if use_edges:
+    #----------------
+        from glob import glob
+        ledges = sorted(glob(path.join(outdir,'*'+lastflag )))
+        fedges = sorted(glob(path.join(outdir,'*'+firstflag)))
+        for last in ledges:
+            root = last[:-len(lastflag)]
+            try:
+                idx = fedges.index(root+firstflag)
+            except ValueError:
+                continue
+            last_lines = open(last,'rt').readlines()
+            first = fedges.pop(idx)
+            first_lines = open(first,'rt').readlines()
+            if verbose:
+                print('Concatenating ', last, ' and ', first)
+            with open(root, 'wt') as fou:
+                fou.writelines(last_lines)
+                fou.writelines(first_lines)
+
+    if verbose:
+        print('Done!')
         return
 
 